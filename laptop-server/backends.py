@@ -0,0 +1,264 @@
+"""
+Injection Backends - Pluggable targets for simulated keyboard input
+press_key replays compiled actions through one of these instead of a hard-wired pynput Controller
+"""
+
+import os
+import struct
+import sys
+import time
+import logging
+from collections import deque
+from typing import Any, Callable, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class InjectionBackend:
+    """Interface: press/release a pynput Key or single character, type text, flush batched events"""
+
+    name = "base"
+
+    def press(self, key: Any):
+        raise NotImplementedError
+
+    def release(self, key: Any):
+        raise NotImplementedError
+
+    def type(self, text: str):
+        for char in text:
+            self.press(char)
+            self.release(char)
+        self.flush()
+
+    def flush(self):
+        """Deliver any events buffered since the last flush"""
+
+    def check(self, key: Any):
+        """Raise ValueError if this backend cannot inject `key`"""
+
+    def warm_up(self):
+        """Do one-time setup now instead of on the first key"""
+
+    def close(self):
+        """Release OS resources held by the backend"""
+
+
+class PynputBackend(InjectionBackend):
+    """Injects through pynput's Controller (SendInput on Windows, X11 on Linux, Quartz on macOS)"""
+
+    name = "pynput"
+
+    def __init__(self):
+        from pynput.keyboard import Controller
+        self.controller = Controller()
+
+    def press(self, key: Any):
+        self.controller.press(key)
+
+    def release(self, key: Any):
+        self.controller.release(key)
+
+    def type(self, text: str):
+        self.controller.type(text)
+
+    def warm_up(self):
+        # The X11 controller builds its keysym -> keycode table on first use
+        if hasattr(type(self.controller), 'keyboard_mapping'):
+            self.controller.keyboard_mapping
+
+
+class RecordingBackend(InjectionBackend):
+    """Records events in memory instead of injecting them, for tests and benchmarks"""
+
+    name = "recording"
+
+    def __init__(self, max_events: int = 10000):
+        self.events: deque = deque(maxlen=max_events)
+        self.presses = 0
+        self.releases = 0
+        self.typed = 0
+
+    def press(self, key: Any):
+        self.presses += 1
+        self.events.append(('press', key))
+
+    def release(self, key: Any):
+        self.releases += 1
+        self.events.append(('release', key))
+
+    def type(self, text: str):
+        self.typed += len(text)
+        self.events.append(('type', text))
+
+    def clear(self):
+        self.events.clear()
+        self.presses = self.releases = self.typed = 0
+
+
+# Linux input-event-codes.h
+EV_SYN = 0x00
+EV_KEY = 0x01
+SYN_REPORT = 0
+KEY_LEFTSHIFT = 42
+
+# uinput ioctls (linux/uinput.h)
+UI_SET_EVBIT = 0x40045564
+UI_SET_KEYBIT = 0x40045565
+UI_DEV_SETUP = 0x405C5503
+UI_DEV_CREATE = 0x5501
+UI_DEV_DESTROY = 0x5502
+BUS_VIRTUAL = 0x06
+
+# pynput Key.name -> Linux key code
+UINPUT_KEYS: Dict[str, int] = {
+    'esc': 1, 'backspace': 14, 'tab': 15, 'enter': 28, 'ctrl': 29, 'ctrl_l': 29,
+    'shift': 42, 'shift_l': 42, 'shift_r': 54, 'alt': 56, 'alt_l': 56, 'space': 57,
+    'caps_lock': 58, 'print_screen': 99, 'ctrl_r': 97, 'alt_r': 100, 'alt_gr': 100,
+    'home': 102, 'up': 103, 'page_up': 104, 'left': 105, 'right': 106, 'end': 107,
+    'down': 108, 'page_down': 109, 'insert': 110, 'delete': 111,
+    'cmd': 125, 'cmd_l': 125, 'cmd_r': 126,
+    'f1': 59, 'f2': 60, 'f3': 61, 'f4': 62, 'f5': 63, 'f6': 64,
+    'f7': 65, 'f8': 66, 'f9': 67, 'f10': 68, 'f11': 87, 'f12': 88,
+}
+
+
+def _build_char_map() -> Dict[str, Tuple[int, bool]]:
+    """Character -> (key code, needs shift) for a US keyboard layout"""
+    chars: Dict[str, Tuple[int, bool]] = {}
+    rows = [
+        ("1234567890-=", "!@#$%^&*()_+", 2),
+        ("qwertyuiop[]", "QWERTYUIOP{}", 16),
+        ("asdfghjkl;'`", 'ASDFGHJKL:"~', 30),
+        ("\\zxcvbnm,./", "|ZXCVBNM<>?", 43),
+    ]
+    for plain, shifted, first_code in rows:
+        for offset, (p, s) in enumerate(zip(plain, shifted)):
+            chars[p] = (first_code + offset, False)
+            chars[s] = (first_code + offset, True)
+    chars[' '] = (57, False)
+    chars['\n'] = (28, False)
+    chars['\t'] = (15, False)
+    return chars
+
+
+UINPUT_CHARS = _build_char_map()
+
+
+class UinputBackend(InjectionBackend):
+    """Writes key events straight to a virtual /dev/uinput keyboard (Linux), skipping X server round trips
+
+    Events are buffered and written with a single os.write() per flush. Needs write access to
+    /dev/uinput (e.g. membership of the 'input' group or a udev rule).
+    """
+
+    name = "uinput"
+    DEVICE = "/dev/uinput"
+    EVENT = struct.Struct('llHHi')
+
+    def __init__(self):
+        if not sys.platform.startswith('linux'):
+            raise OSError("The uinput backend is only available on Linux")
+        self.fd = -1
+        self.buffer: List[bytes] = []
+        # Opened here so a missing device or permission makes create_backend fall back to pynput
+        self._open()
+
+    def _open(self):
+        import fcntl
+
+        fd = os.open(self.DEVICE, os.O_WRONLY | os.O_NONBLOCK)
+        try:
+            fcntl.ioctl(fd, UI_SET_EVBIT, EV_KEY)
+            for code in set(UINPUT_KEYS.values()) | {code for code, _ in UINPUT_CHARS.values()}:
+                fcntl.ioctl(fd, UI_SET_KEYBIT, code)
+            # struct uinput_setup: input_id {bustype, vendor, product, version}, name[80], ff_effects_max
+            setup = struct.pack('HHHH80sI', BUS_VIRTUAL, 0x4B59, 0x0001, 1, b"Keyote Virtual Keyboard", 0)
+            fcntl.ioctl(fd, UI_DEV_SETUP, setup)
+            fcntl.ioctl(fd, UI_DEV_CREATE)
+        except Exception:
+            os.close(fd)
+            raise
+        self.fd = fd
+        # Give the compositor/X server a moment to pick up the new device
+        time.sleep(0.2)
+        logger.info("uinput virtual keyboard created")
+
+    def _event(self, code: int, value: int):
+        self.buffer.append(self.EVENT.pack(0, 0, EV_KEY, code, value))
+        self.buffer.append(self.EVENT.pack(0, 0, EV_SYN, SYN_REPORT, 0))
+
+    def _resolve(self, key: Any) -> Tuple[int, bool]:
+        if isinstance(key, str):
+            if key in UINPUT_CHARS:
+                return UINPUT_CHARS[key]
+            raise ValueError(f"Character not available on the uinput keyboard: {key!r}")
+        name = getattr(key, 'name', None)
+        if name in UINPUT_KEYS:
+            return UINPUT_KEYS[name], False
+        raise ValueError(f"Key not available on the uinput keyboard: {key!r}")
+
+    def check(self, key: Any):
+        self._resolve(key)
+
+    def press(self, key: Any):
+        code, shift = self._resolve(key)
+        if shift:
+            self._event(KEY_LEFTSHIFT, 1)
+        self._event(code, 1)
+
+    def release(self, key: Any):
+        code, shift = self._resolve(key)
+        self._event(code, 0)
+        if shift:
+            self._event(KEY_LEFTSHIFT, 0)
+
+    def type(self, text: str):
+        # Resolve every character first, so an unknown one leaves nothing half-typed in the buffer
+        codes = [self._resolve(char) for char in text]
+        for code, shift in codes:
+            if shift:
+                self._event(KEY_LEFTSHIFT, 1)
+            self._event(code, 1)
+            self._event(code, 0)
+            if shift:
+                self._event(KEY_LEFTSHIFT, 0)
+        self.flush()
+
+    def flush(self):
+        if not self.buffer:
+            return
+        data = b"".join(self.buffer)
+        self.buffer.clear()
+        if self.fd < 0:
+            raise OSError("The uinput device is closed")
+        os.write(self.fd, data)
+
+    def close(self):
+        if self.fd >= 0:
+            import fcntl
+            fcntl.ioctl(self.fd, UI_DEV_DESTROY)
+            os.close(self.fd)
+            self.fd = -1
+
+
+BACKENDS: Dict[str, Callable[[], InjectionBackend]] = {
+    PynputBackend.name: PynputBackend,
+    RecordingBackend.name: RecordingBackend,
+    UinputBackend.name: UinputBackend,
+}
+
+
+def create_backend(name: str) -> InjectionBackend:
+    """Instantiate the named backend, falling back to pynput if it is unknown or unavailable"""
+    factory = BACKENDS.get(name)
+    if factory is None:
+        print(f"Unknown injection backend '{name}', using pynput")
+        return PynputBackend()
+    try:
+        return factory()
+    except Exception as e:
+        if name == PynputBackend.name:
+            raise
+        print(f"Injection backend '{name}' unavailable ({e}), using pynput")
+        return PynputBackend()
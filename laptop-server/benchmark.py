@@ -0,0 +1,278 @@
+"""
+Keyote Server Benchmark - Reproducible load test for the /key hot path
+Drives the real FastAPI app (in-process over ASGI, or over localhost HTTP) with the recording
+injection backend and reports throughput, latency and CPU per key as JSON.
+
+Examples:
+    python benchmark.py --requests 5000 --concurrency 8
+    python benchmark.py --mode localhost --no-reuse --mix plain=70,chord=20,repeat=10
+"""
+
+import argparse
+import asyncio
+import contextlib
+import http.client
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+# pynput needs a display on Linux; a headless benchmark run never touches the real keyboard
+if sys.platform.startswith("linux") and not os.environ.get("DISPLAY"):
+    os.environ.setdefault("PYNPUT_BACKEND", "dummy")
+
+PLAIN_KEYS = list("abcdefghijklmnopqrstuvwxyz0123456789") + ["space", "enter", "backspace", "left", "right"]
+CHORD_KEYS = ["ctrl+c", "ctrl+v", "ctrl+z", "alt+tab", "ctrl+shift+t"]
+
+
+def parse_mix(spec: str) -> List[Tuple[str, int]]:
+    mix = []
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        if name not in ("plain", "chord", "repeat"):
+            raise argparse.ArgumentTypeError(f"Unknown key kind '{name}'")
+        mix.append((name, int(weight or 1)))
+    return mix
+
+
+def build_workload(args) -> List[bytes]:
+    """Deterministic list of /key request bodies for the configured mix and seed"""
+    rng = random.Random(args.seed)
+    kinds, weights = zip(*args.mix)
+    bodies = []
+    for kind in rng.choices(kinds, weights=weights, k=args.requests):
+        if kind == "chord":
+            command = {"key": rng.choice(CHORD_KEYS)}
+        elif kind == "repeat":
+            command = {"key": rng.choice(["backspace", "left", "right"]), "repeat": args.repeat}
+        else:
+            command = {"key": rng.choice(PLAIN_KEYS), "shift": rng.random() < 0.1}
+        command["wait"] = args.wait
+        bodies.append(json.dumps(command).encode())
+    return bodies
+
+
+async def run_inprocess(app, bodies: List[bytes], concurrency: int) -> Tuple[List[float], int]:
+    """Call the ASGI app directly, concurrency tasks each sending requests back to back"""
+    latencies: List[float] = []
+    errors = 0
+    cursor = iter(bodies)
+
+    async def call(body: bytes) -> int:
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+            "method": "POST", "scheme": "http", "path": "/key", "raw_path": b"/key",
+            "root_path": "", "query_string": b"",
+            "headers": [(b"host", b"bench"), (b"content-type", b"application/json"),
+                        (b"content-length", str(len(body)).encode())],
+            "client": ("127.0.0.1", 50000), "server": ("127.0.0.1", 80), "state": {},
+        }
+        status = 0
+        sent = False
+
+        async def receive():
+            nonlocal sent
+            if not sent:
+                sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            await asyncio.sleep(3600)
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+
+        await app(scope, receive, send)
+        return status
+
+    async def worker():
+        nonlocal errors
+        for body in cursor:
+            start = time.perf_counter()
+            status = await call(body)
+            latencies.append(time.perf_counter() - start)
+            if status != 200:
+                errors += 1
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, errors
+
+
+def run_localhost(app, bodies: List[bytes], concurrency: int, reuse: bool) -> Tuple[List[float], int]:
+    """Serve the app with uvicorn on a free localhost port and drive it from client threads"""
+    import uvicorn
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(app, log_config=None, access_log=False, lifespan="off"))
+    thread = threading.Thread(target=server.run, kwargs={"sockets": [sock]}, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+
+    latencies: List[float] = []
+    errors = 0
+    lock = threading.Lock()
+    cursor = iter(bodies)
+    headers = {"Content-Type": "application/json"}
+
+    def client():
+        nonlocal errors
+        conn = http.client.HTTPConnection("127.0.0.1", port)
+        local_latencies = []
+        local_errors = 0
+        while True:
+            with lock:
+                body = next(cursor, None)
+            if body is None:
+                break
+            if not reuse:
+                conn.close()
+                conn = http.client.HTTPConnection("127.0.0.1", port)
+            start = time.perf_counter()
+            conn.request("POST", "/key", body=body, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            local_latencies.append(time.perf_counter() - start)
+            if response.status != 200:
+                local_errors += 1
+        conn.close()
+        with lock:
+            latencies.extend(local_latencies)
+            errors += local_errors
+
+    clients = [threading.Thread(target=client) for _ in range(concurrency)]
+    for t in clients:
+        t.start()
+    for t in clients:
+        t.join()
+
+    server.should_exit = True
+    thread.join(5)
+    return latencies, errors
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(q / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=Path(__file__).parent,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+def wait_idle(injector):
+    """Block until nothing is queued and the job the injector was running has finished
+
+    An empty queue alone is not enough: the last run has been taken off the queue while it is
+    being injected. A no-op control job runs only once the thread is free, so its completion marks
+    the end of that run; a job split across turns is back in the queue by then and is waited for.
+    """
+    while True:
+        while injector.depth:
+            time.sleep(0.001)
+        injector.run_next(lambda: None, "benchmark drain").result()
+        if not injector.depth:
+            return
+
+
+def run_benchmark(args) -> Dict[str, Any]:
+    import server
+    from backends import RecordingBackend
+
+    recorder = RecordingBackend(max_events=0)
+    server.keyboard = recorder
+    bodies = build_workload(args)
+    # Measure the request path, not backpressure: the client fires faster than keys are injected
+    server.injector.max_pending = server.injector.max_pending_per_client = 0
+
+    server.injector.start()
+    injected_before = server.injector.injected
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        cpu_start = time.process_time()
+        wall_start = time.perf_counter()
+        if args.mode == "inprocess":
+            latencies, errors = asyncio.run(run_inprocess(server.app, bodies, args.concurrency))
+        else:
+            latencies, errors = run_localhost(server.app, bodies, args.concurrency, args.reuse)
+        requests_done = time.perf_counter()
+        wait_idle(server.injector)
+        wall_end = time.perf_counter()
+        cpu = time.process_time() - cpu_start
+    server.injector.stop()
+
+    keys = server.injector.injected - injected_before
+    latencies.sort()
+    request_time = requests_done - wall_start
+    total_time = wall_end - wall_start
+    return {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": {
+            "mode": args.mode,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "mix": dict(args.mix),
+            "repeat": args.repeat,
+            "reuse": args.reuse,
+            "wait": args.wait,
+            "seed": args.seed,
+        },
+        "errors": errors,
+        "keys_injected": keys,
+        "key_events": recorder.presses + recorder.releases,
+        "duration_s": round(total_time, 4),
+        "requests_per_s": round(len(latencies) / request_time, 1) if request_time else 0,
+        "keys_per_s": round(keys / total_time, 1) if total_time else 0,
+        "latency_ms": {
+            "mean": round(sum(latencies) / len(latencies) * 1000, 4) if latencies else 0,
+            "p50": round(percentile(latencies, 50) * 1000, 4),
+            "p99": round(percentile(latencies, 99) * 1000, 4),
+            "max": round(latencies[-1] * 1000, 4) if latencies else 0,
+        },
+        "cpu_us_per_key": round(cpu / keys * 1e6, 2) if keys else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Keyote server /key hot path")
+    parser.add_argument("--mode", choices=["inprocess", "localhost"], default="inprocess")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("plain=90,chord=8,repeat=2"),
+                        help="Weighted key kinds, e.g. plain=80,chord=15,repeat=5")
+    parser.add_argument("--repeat", type=int, default=5, help="repeat count for 'repeat' keys")
+    parser.add_argument("--no-reuse", dest="reuse", action="store_false",
+                        help="open a new connection per request (localhost mode)")
+    parser.add_argument("--wait", action="store_true", help="wait for injection before each response")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", type=Path, help="also write the JSON result to this file")
+    args = parser.parse_args()
+
+    result = run_benchmark(args)
+    text = json.dumps(result, indent=2)
+    print(text)
+    if args.output:
+        args.output.write_text(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+"""
+Clipboard - Host clipboard access for paste-mode typing
+/type can put a large block of text on the clipboard and send the paste chord, instead of one key
+event per character. Each platform has its own implementation; MemoryClipboard stands in for tests.
+"""
+
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional, Type
+
+logger = logging.getLogger(__name__)
+
+# Seconds a clipboard command may take before it is treated as failed
+COMMAND_TIMEOUT = 2.0
+
+
+class Clipboard:
+    """Interface: read and replace the text on the host clipboard (both raise OSError on failure)"""
+
+    name = "base"
+
+    def get(self) -> Optional[str]:
+        """Current text, or None if the clipboard is empty or holds something other than text"""
+        raise NotImplementedError
+
+    def set(self, text: str):
+        raise NotImplementedError
+
+
+class MemoryClipboard(Clipboard):
+    """Keeps the text in memory instead of touching the OS, for tests and benchmarks"""
+
+    name = "memory"
+
+    def __init__(self, text: Optional[str] = None):
+        self.text = text
+        # Every text set, oldest first
+        self.history: List[str] = []
+
+    def get(self) -> Optional[str]:
+        return self.text
+
+    def set(self, text: str):
+        self.text = text
+        self.history.append(text)
+
+
+class CommandClipboard(Clipboard):
+    """Pipes text through clipboard command-line tools (pbcopy, wl-copy, xclip, xsel)"""
+
+    def __init__(self, copy: List[str], paste: List[str]):
+        self.copy_command = copy
+        self.paste_command = paste
+
+    def _run(self, command: List[str], **kwargs) -> subprocess.CompletedProcess:
+        try:
+            result = subprocess.run(command, timeout=COMMAND_TIMEOUT, env={**os.environ, 'LANG': 'en_US.UTF-8'},
+                                    **kwargs)
+        except subprocess.TimeoutExpired as e:
+            raise OSError(f"{command[0]} timed out") from e
+        if result.returncode != 0:
+            stderr = (result.stderr or b"").decode('utf-8', 'replace').strip()
+            raise OSError(f"{command[0]} failed: {stderr or result.returncode}")
+        return result
+
+    def get(self) -> Optional[str]:
+        try:
+            output = self._run(self.paste_command, capture_output=True).stdout
+        except OSError:
+            # Tools exit non-zero when the clipboard is empty or holds no text
+            return None
+        # Bytes, not text mode, so "\r\n" survives the round trip
+        return output.decode('utf-8', 'replace')
+
+    def set(self, text: str):
+        # xclip and wl-copy fork a process that keeps serving the selection; it must not inherit
+        # pipes, or run() would wait for it until the timeout
+        self._run(self.copy_command, input=text.encode('utf-8'),
+                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+class MacClipboard(CommandClipboard):
+    name = "macos"
+
+    def __init__(self):
+        super().__init__(["pbcopy"], ["pbpaste"])
+
+
+class LinuxClipboard(CommandClipboard):
+    """wl-clipboard on Wayland, otherwise xclip or xsel; the tool is looked up when first used"""
+
+    name = "linux"
+
+    TOOLS = (
+        ("wl-copy", ["wl-copy"], ["wl-paste", "--no-newline"]),
+        ("xclip", ["xclip", "-selection", "clipboard", "-in"], ["xclip", "-selection", "clipboard", "-out"]),
+        ("xsel", ["xsel", "--clipboard", "--input"], ["xsel", "--clipboard", "--output"]),
+    )
+
+    def __init__(self):
+        super().__init__([], [])
+
+    def _find_tool(self):
+        if self.copy_command:
+            return
+        wayland = bool(os.environ.get("WAYLAND_DISPLAY"))
+        for tool, copy, paste in self.TOOLS:
+            if tool == "wl-copy" and not wayland:
+                continue
+            if shutil.which(tool):
+                self.copy_command, self.paste_command = copy, paste
+                logger.info(f"Using {tool} for clipboard access")
+                return
+        raise OSError("No clipboard tool found (install wl-clipboard, xclip or xsel)")
+
+    def get(self) -> Optional[str]:
+        self._find_tool()
+        return super().get()
+
+    def set(self, text: str):
+        self._find_tool()
+        super().set(text)
+
+
+class WindowsClipboard(Clipboard):
+    """Win32 clipboard through ctypes (CF_UNICODETEXT)"""
+
+    name = "windows"
+    CF_UNICODETEXT = 13
+    GMEM_MOVEABLE = 0x0002
+
+    def __init__(self):
+        import ctypes
+        from ctypes import wintypes
+
+        self.ctypes = ctypes
+        self.user32 = ctypes.WinDLL('user32', use_last_error=True)
+        self.kernel32 = ctypes.WinDLL('kernel32', use_last_error=True)
+        self.user32.OpenClipboard.argtypes = [wintypes.HWND]
+        self.user32.OpenClipboard.restype = wintypes.BOOL
+        self.user32.GetClipboardData.argtypes = [wintypes.UINT]
+        self.user32.GetClipboardData.restype = wintypes.HANDLE
+        self.user32.SetClipboardData.argtypes = [wintypes.UINT, wintypes.HANDLE]
+        self.user32.SetClipboardData.restype = wintypes.HANDLE
+        self.kernel32.GlobalAlloc.argtypes = [wintypes.UINT, ctypes.c_size_t]
+        self.kernel32.GlobalAlloc.restype = wintypes.HGLOBAL
+        self.kernel32.GlobalLock.argtypes = [wintypes.HGLOBAL]
+        self.kernel32.GlobalLock.restype = wintypes.LPVOID
+        self.kernel32.GlobalUnlock.argtypes = [wintypes.HGLOBAL]
+        self.kernel32.GlobalFree.argtypes = [wintypes.HGLOBAL]
+
+    def _open(self):
+        # Another application may hold the clipboard for a moment
+        for _ in range(20):
+            if self.user32.OpenClipboard(None):
+                return
+            time.sleep(0.01)
+        raise OSError(f"OpenClipboard failed (error {self.ctypes.get_last_error()})")
+
+    def get(self) -> Optional[str]:
+        self._open()
+        try:
+            handle = self.user32.GetClipboardData(self.CF_UNICODETEXT)
+            if not handle:
+                return None
+            pointer = self.kernel32.GlobalLock(handle)
+            if not pointer:
+                return None
+            try:
+                return self.ctypes.wstring_at(pointer)
+            finally:
+                self.kernel32.GlobalUnlock(handle)
+        finally:
+            self.user32.CloseClipboard()
+
+    def set(self, text: str):
+        data = (text + "\0").encode('utf-16-le')
+        handle = self.kernel32.GlobalAlloc(self.GMEM_MOVEABLE, len(data))
+        if not handle:
+            raise OSError("GlobalAlloc failed")
+        pointer = self.kernel32.GlobalLock(handle)
+        if not pointer:
+            error = self.ctypes.get_last_error()
+            self.kernel32.GlobalFree(handle)
+            raise OSError(f"GlobalLock failed (error {error})")
+        self.ctypes.memmove(pointer, data, len(data))
+        self.kernel32.GlobalUnlock(handle)
+        try:
+            self._open()
+        except OSError:
+            self.kernel32.GlobalFree(handle)
+            raise
+        try:
+            self.user32.EmptyClipboard()
+            # On success the clipboard owns the memory
+            if not self.user32.SetClipboardData(self.CF_UNICODETEXT, handle):
+                self.kernel32.GlobalFree(handle)
+                raise OSError(f"SetClipboardData failed (error {self.ctypes.get_last_error()})")
+        finally:
+            self.user32.CloseClipboard()
+
+
+CLIPBOARDS: Dict[str, Type[Clipboard]] = {
+    MemoryClipboard.name: MemoryClipboard,
+    MacClipboard.name: MacClipboard,
+    LinuxClipboard.name: LinuxClipboard,
+    WindowsClipboard.name: WindowsClipboard,
+}
+
+
+def create_clipboard(name: str = "auto") -> Clipboard:
+    """Instantiate the named clipboard, or the one for this platform for "auto" """
+    if name == "auto":
+        if sys.platform == 'win32':
+            name = WindowsClipboard.name
+        elif sys.platform == 'darwin':
+            name = MacClipboard.name
+        else:
+            name = LinuxClipboard.name
+    factory = CLIPBOARDS.get(name)
+    if factory is None:
+        raise ValueError(f"Unknown clipboard '{name}'")
+    return factory()
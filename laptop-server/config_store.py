@@ -0,0 +1,166 @@
+"""
+Config Store - The one reader/writer of config.json
+Writes are atomic (temp file + os.replace), so a crash or a concurrent reader never sees half a
+file. A watcher thread polls the file's mtime/size and tells listeners which keys changed, whether
+the change came from this process or from an editor.
+"""
+
+import json
+import logging
+import os
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+POLL_INTERVAL = 1.0
+
+# listener(full config, names of the keys that changed)
+ConfigListener = Callable[[Dict[str, Any], Set[str]], None]
+
+
+class ConfigStore:
+    """config.json shared by the server and the dashboard"""
+
+    def __init__(self, path: Path, poll_interval: float = POLL_INTERVAL):
+        self.path = Path(path)
+        self.poll_interval = poll_interval
+        self._lock = threading.RLock()
+        self._listeners: List[ConfigListener] = []
+        self._data: Optional[Dict[str, Any]] = None
+        self._signature: Optional[Tuple[int, int]] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _stat(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def _load(self) -> Dict[str, Any]:
+        """Read the file; a missing file is empty, an unreadable one keeps the last good contents"""
+        signature = self._stat()
+        if signature is None:
+            data: Dict[str, Any] = {}
+        else:
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if not isinstance(data, dict):
+                    raise ValueError("top level is not an object")
+            except (OSError, ValueError) as e:
+                logger.error(f"Ignoring unreadable {self.path.name}: {e}")
+                return dict(self._data or {})
+        self._signature = signature
+        return data
+
+    def read(self) -> Dict[str, Any]:
+        """Current contents (a copy)"""
+        with self._lock:
+            if self._data is None:
+                self._data = self._load()
+            return dict(self._data)
+
+    def update(self, changes: Dict[str, Any]) -> Set[str]:
+        """Merge `changes` into the file atomically and notify listeners; returns the changed keys"""
+        with self._lock:
+            data = self.read()
+            changed = {key for key, value in changes.items() if key not in data or data[key] != value}
+            if not changed and self._stat() is not None:
+                return changed
+            data.update(changes)
+            self._write(data)
+            self._data = data
+        self._notify(data, changed)
+        return changed
+
+    def _write(self, data: Dict[str, Any]):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix=f".{self.path.name}.", suffix=".tmp", dir=self.path.parent)
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(data, f, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+        self._signature = self._stat()
+
+    def add_listener(self, listener: ConfigListener):
+        with self._lock:
+            if listener not in self._listeners:
+                self._listeners.append(listener)
+
+    def remove_listener(self, listener: ConfigListener):
+        with self._lock:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+    def _notify(self, data: Dict[str, Any], changed: Set[str]):
+        if not changed:
+            return
+        with self._lock:
+            listeners = list(self._listeners)
+        for listener in listeners:
+            try:
+                listener(dict(data), set(changed))
+            except Exception as e:
+                logger.error(f"Config listener failed: {e}")
+
+    def check(self) -> Set[str]:
+        """Re-read the file if it changed on disk; returns the keys that changed"""
+        with self._lock:
+            if self._data is not None and self._stat() == self._signature:
+                return set()
+            old = self._data or {}
+            data = self._load()
+            changed = {key for key in old.keys() | data.keys() if old.get(key) != data.get(key)}
+            self._data = data
+        self._notify(data, changed)
+        return changed
+
+    def start(self):
+        """Start the file watcher (no-op if already running)"""
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self.read()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="keyote-config", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 2.0):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.check()
+            except Exception as e:
+                logger.error(f"Config watcher error: {e}")
+
+
+_stores: Dict[Path, ConfigStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(path: Path) -> ConfigStore:
+    """The process-wide store for a config file, so the server and dashboard share listeners"""
+    key = Path(path).resolve()
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = _stores[key] = ConfigStore(key)
+        return store
@@ -3,17 +3,21 @@ Keyote Server Dashboard - Professional GUI Application
 Modern PyQt6 desktop interface for laptop keyboard server control
 """
 
+import atexit
 import sys
-import json
-import socket
+import ipaddress
 import tempfile
+import threading
 import os
+import time
 import logging
 import traceback
 from pathlib import Path
 from datetime import datetime, timedelta
 from typing import Optional
 
+from startup_profile import profile
+
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
     QLabel, QPushButton, QLineEdit, QTextEdit, QGroupBox, QCheckBox,
@@ -22,12 +26,25 @@ from PyQt6.QtWidgets import (
 )
 from PyQt6.QtCore import Qt, QTimer, pyqtSignal, QThread, QSize
 from PyQt6.QtGui import QIcon, QFont, QPixmap, QAction, QPalette, QColor
+profile.mark("PyQt6 imported")
 
+from config_store import get_store
+from key_log import start_queue_logging
+from net_info import network
 from server_manager import ServerManager
 
 
 VERSION = "1.0.0"
 
+# Server log events are drained in batches on a GUI timer
+LOG_DRAIN_INTERVAL_MS = 100
+LOG_DRAIN_BATCH = 500
+LOG_MAX_LINES = 1000
+# Key events closer together than this form one burst, logged as a single summary line
+KEY_BURST_GAP = 0.5
+# Bursts with fewer keys than this are logged key by key
+KEY_BURST_MIN = 4
+
 # Get proper directory for config and log files
 if getattr(sys, 'frozen', False):
     # Running as compiled executable
@@ -39,16 +56,18 @@ else:
 CONFIG_FILE = APP_DIR / "config.json"
 LOG_FILE = APP_DIR / "keyote_server_errors.log"
 
+def _log_handlers(log_file: Path) -> list:
+    """File + console handlers; they run on the log listener thread, not the GUI thread"""
+    formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+    handlers = [logging.FileHandler(log_file), logging.StreamHandler()]
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    return handlers
+
+
 # Setup logging with fallback to %APPDATA% if permission denied
 try:
-    logging.basicConfig(
-        level=logging.DEBUG,
-        format='%(asctime)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler(LOG_FILE),
-            logging.StreamHandler()
-        ]
-    )
+    _log_listener = start_queue_logging(logging.getLogger(), _log_handlers(LOG_FILE), logging.DEBUG)
     logger = logging.getLogger(__name__)
 except PermissionError:
     # Fallback to %APPDATA%\KeyoteServer
@@ -57,16 +76,13 @@ except PermissionError:
     LOG_FILE = APPDATA_DIR / "keyote_server_errors.log"
     CONFIG_FILE = APPDATA_DIR / "config.json"
     
-    logging.basicConfig(
-        level=logging.DEBUG,
-        format='%(asctime)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler(LOG_FILE),
-            logging.StreamHandler()
-        ]
-    )
+    _log_listener = start_queue_logging(logging.getLogger(), _log_handlers(LOG_FILE), logging.DEBUG)
     logger = logging.getLogger(__name__)
     logger.warning(f"Using fallback directory: {APPDATA_DIR}")
+atexit.register(_log_listener.stop)
+
+# The server module shares this store, so saved settings reach a running server immediately
+config_store = get_store(CONFIG_FILE)
 
 
 class ServerThread(QThread):
@@ -79,7 +95,30 @@ class ServerThread(QThread):
         self.server_manager = server_manager
         
     def run(self):
-        self.server_manager.start()
+        try:
+            self.server_manager.start()
+        except Exception:
+            # Already logged and reported by ServerManager; finished still fires
+            pass
+
+
+class PreloadThread(QThread):
+    """Imports the server stack and warms up injection while the window is idle"""
+    loaded = pyqtSignal(object)
+    failed = pyqtSignal(str)
+
+    def __init__(self, server_manager):
+        super().__init__()
+        self.server_manager = server_manager
+
+    def run(self):
+        threading.current_thread().name = "keyote-preload"
+        try:
+            self.loaded.emit(self.server_manager.preload())
+        except Exception as e:
+            logger.error(f"Server preload failed: {e}")
+            logger.error(traceback.format_exc())
+            self.failed.emit(str(e))
 
 
 class SettingsDialog(QDialog):
@@ -112,6 +151,11 @@ class SettingsDialog(QDialog):
         self.log_level_combo.setCurrentText("INFO")
         layout.addRow("Log Level:", self.log_level_combo)
         
+        # Allowed IPs
+        self.allowed_ips_input = QLineEdit()
+        self.allowed_ips_input.setPlaceholderText("All clients (e.g. 192.168.1.0/24, 10.0.0.5)")
+        layout.addRow("Allowed IPs:", self.allowed_ips_input)
+        
         # Theme
         self.theme_combo = QComboBox()
         self.theme_combo.addItems(["Dark", "Light"])
@@ -133,31 +177,34 @@ class SettingsDialog(QDialog):
     def load_settings(self):
         if CONFIG_FILE.exists():
             try:
-                with open(CONFIG_FILE, 'r') as f:
-                    config = json.load(f)
+                config = config_store.read()
                 self.port_spin.setValue(config.get('port', 5000))
                 self.host_input.setText(config.get('host', '0.0.0.0'))
                 self.log_level_combo.setCurrentText(config.get('log_level', 'INFO'))
+                self.allowed_ips_input.setText(", ".join(config.get('allowed_ips', [])))
                 self.theme_combo.setCurrentText(config.get('theme', 'Dark'))
             except Exception as e:
                 print(f"Error loading settings: {e}")
                 
     def save_settings(self):
+        allowed_ips = [entry.strip() for entry in self.allowed_ips_input.text().split(',') if entry.strip()]
+        for entry in allowed_ips:
+            try:
+                ipaddress.ip_network(entry, strict=False)
+            except ValueError:
+                QMessageBox.warning(self, "Invalid Address", f"Not an IP address or CIDR range: {entry}")
+                return
         try:
-            config = {
+            # Merged into config.json, keeping the settings this dialog does not edit
+            config_store.update({
                 'port': self.port_spin.value(),
                 'host': self.host_input.text(),
                 'log_level': self.log_level_combo.currentText(),
-                'allowed_ips': [],
+                'allowed_ips': allowed_ips,
                 'theme': self.theme_combo.currentText(),
-                'auto_start': False,
-                'minimize_to_tray': True
-            }
+            })
             
-            with open(CONFIG_FILE, 'w') as f:
-                json.dump(config, f, indent=2)
-                
-            QMessageBox.information(self, "Success", "Settings saved! Restart server to apply changes.")
+            QMessageBox.information(self, "Success", "Settings saved and applied.")
             self.accept()
         except Exception as e:
             QMessageBox.critical(self, "Error", f"Failed to save settings: {e}")
@@ -165,6 +212,10 @@ class SettingsDialog(QDialog):
 
 class DashboardWindow(QMainWindow):
     """Main dashboard window"""
+    # Emitted (from any thread) with the changed keys when config.json changes
+    config_changed = pyqtSignal(object)
+    # Emitted from the server thread with the finished restart future
+    restart_finished = pyqtSignal(object)
     
     def __init__(self):
         super().__init__()
@@ -172,13 +223,26 @@ class DashboardWindow(QMainWindow):
         try:
             self.server_manager = ServerManager()
             self.server_thread: Optional[ServerThread] = None
+            self.preload_thread: Optional[PreloadThread] = None
+            # The server module once fully imported; the timers below read stats and logs from it
+            self.server_module = None
+            self._profile_reported = False
             self.start_time: Optional[datetime] = None
             self.uptime_timer = QTimer()
             self.uptime_timer.timeout.connect(self.update_uptime)
+            self.log_timer = QTimer()
+            self.log_timer.timeout.connect(self.drain_server_log)
+            self._key_burst: Optional[list] = None
+            self._log_dropped_seen = 0
+            self._network_version = 0
+            # Set when Exit waits for the server to stop before quitting
+            self._quitting = False
             
             self.setWindowTitle(f"Keyote Server Dashboard v{VERSION}")
             self.setMinimumSize(600, 700)
             
+            # Discover addresses on the refresh thread while the UI is built
+            network.start()
             self.setup_ui()
             self.setup_tray()
             self.apply_theme()
@@ -186,6 +250,13 @@ class DashboardWindow(QMainWindow):
             
             # Update timer for uptime
             self.uptime_timer.start(1000)
+            self.log_timer.start(LOG_DRAIN_INTERVAL_MS)
+            # Runs once the event loop is up, i.e. after the window is shown
+            QTimer.singleShot(0, self.start_preload)
+            self.config_changed.connect(self.on_config_changed)
+            self.restart_finished.connect(self.on_restart_finished)
+            config_store.add_listener(lambda data, changed: self.config_changed.emit(changed))
+            config_store.start()
             logger.info("Dashboard initialized successfully")
         except Exception as e:
             logger.error(f"Error initializing dashboard: {e}")
@@ -264,8 +335,13 @@ class DashboardWindow(QMainWindow):
         # Connections row
         self.connections_label = QLabel("Connections: 0 active")
         
+        # Key path latency per stage (filled in while the server runs)
+        self.latency_label = QLabel("Latency: no keys yet")
+        self.latency_label.setStyleSheet("font-family: 'Consolas', monospace; font-size: 11px; color: #aaa;")
+        
         layout.addLayout(status_layout)
         layout.addWidget(self.connections_label)
+        layout.addWidget(self.latency_label)
         
         group.setLayout(layout)
         return group
@@ -331,11 +407,18 @@ class DashboardWindow(QMainWindow):
         self.start_stop_btn.setMinimumHeight(40)
         self.start_stop_btn.clicked.connect(self.toggle_server)
         
+        self.restart_btn = QPushButton("Restart")
+        self.restart_btn.setMinimumHeight(40)
+        self.restart_btn.setToolTip("Re-apply config.json without dropping connections or queued keys")
+        self.restart_btn.setEnabled(False)
+        self.restart_btn.clicked.connect(self.restart_server)
+        
         settings_btn = QPushButton("Settings")
         settings_btn.setMinimumHeight(40)
         settings_btn.clicked.connect(self.open_settings)
         
         layout.addWidget(self.start_stop_btn)
+        layout.addWidget(self.restart_btn)
         layout.addWidget(settings_btn)
         
         group.setLayout(layout)
@@ -350,6 +433,7 @@ class DashboardWindow(QMainWindow):
         self.log_display.setReadOnly(True)
         self.log_display.setMaximumHeight(200)
         self.log_display.setStyleSheet("font-family: 'Consolas', monospace; font-size: 11px;")
+        self.log_display.document().setMaximumBlockCount(LOG_MAX_LINES)
         
         clear_log_btn = QPushButton("Clear Log")
         clear_log_btn.clicked.connect(self.clear_log)
@@ -392,6 +476,10 @@ class DashboardWindow(QMainWindow):
         self.tray_start_action = QAction("Start Server", self)
         self.tray_start_action.triggered.connect(self.toggle_server)
         
+        self.tray_restart_action = QAction("Restart Server", self)
+        self.tray_restart_action.setEnabled(False)
+        self.tray_restart_action.triggered.connect(self.restart_server)
+        
         settings_action = QAction("Settings", self)
         settings_action.triggered.connect(self.open_settings)
         
@@ -401,6 +489,7 @@ class DashboardWindow(QMainWindow):
         tray_menu.addAction(show_action)
         tray_menu.addSeparator()
         tray_menu.addAction(self.tray_start_action)
+        tray_menu.addAction(self.tray_restart_action)
         tray_menu.addSeparator()
         tray_menu.addAction(settings_action)
         tray_menu.addSeparator()
@@ -463,8 +552,7 @@ class DashboardWindow(QMainWindow):
         """Load configuration from file"""
         if CONFIG_FILE.exists():
             try:
-                with open(CONFIG_FILE, 'r') as f:
-                    config = json.load(f)
+                config = config_store.read()
                 self.port_input.setText(str(config.get('port', 5000)))
                 self.auto_start_check.setChecked(config.get('auto_start', False))
                 self.minimize_tray_check.setChecked(config.get('minimize_to_tray', True))
@@ -473,16 +561,41 @@ class DashboardWindow(QMainWindow):
             except Exception as e:
                 self.log(f"Error loading config: {e}")
                 
+    def on_config_changed(self, changed: set):
+        """Keep the port field, URL and theme in step with config.json (settings dialog or editor)"""
+        if changed & {'port', 'theme', 'auto_start', 'minimize_to_tray'}:
+            self.load_config()
+            self.url_display.setText(f"http://{self.get_local_ip()}:{self.port_input.text()}")
+
     def get_local_ip(self) -> str:
-        """Get local IP address"""
-        try:
-            s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-            s.connect(("8.8.8.8", 80))
-            ip = s.getsockname()[0]
-            s.close()
-            return ip
-        except Exception:
-            return "127.0.0.1"
+        """Get local IP address (cached; see net_info)"""
+        return network.primary
+
+    def start_preload(self):
+        """Load the server modules in the background so Start and the first key are fast"""
+        self.preload_thread = PreloadThread(self.server_manager)
+        self.preload_thread.loaded.connect(self.on_server_loaded)
+        self.preload_thread.failed.connect(lambda error: self.log(f"Server preload failed: {error}"))
+        self.preload_thread.start()
+
+    def on_server_loaded(self, server_module):
+        self.server_module = server_module
+        profile.mark("server preloaded")
+        logger.info("Server modules preloaded")
+
+    def update_network(self):
+        """Refresh the IP and URL fields after the interface cache picks up a change"""
+        if network.version == self._network_version:
+            return
+        self._network_version = network.version
+        self.ip_display.setText(network.primary)
+        self.url_display.setText(f"http://{network.primary}:{self.port_input.text()}")
+        tooltip = "\n".join(f"{a.address} ({a.name or 'unknown'}, {a.kind})"
+                             for a in network.addresses if a.kind != 'loopback' and not a.link_local)
+        self.ip_display.setToolTip(tooltip)
+        # Every URL a phone can use, so one on another interface can be typed in by hand
+        port = self.port_input.text()
+        self.url_display.setToolTip("\n".join(network.urls(int(port))) if port.isdigit() else tooltip)
             
     def copy_ip(self):
         """Copy IP address to clipboard"""
@@ -504,20 +617,14 @@ class DashboardWindow(QMainWindow):
                 QMessageBox.warning(self, "Invalid Port", "Port must be between 1024 and 65535")
                 return
                 
-            if CONFIG_FILE.exists():
-                with open(CONFIG_FILE, 'r') as f:
-                    config = json.load(f)
-            else:
-                config = {}
-                
-            config['port'] = new_port
-            
-            with open(CONFIG_FILE, 'w') as f:
-                json.dump(config, f, indent=2)
+            config_store.update({'port': new_port})
                 
             self.url_display.setText(f"http://{self.get_local_ip()}:{new_port}")
-            self.log(f"Port updated to {new_port}. Restart server to apply.")
-            QMessageBox.information(self, "Success", "Port updated! Restart server to apply changes.")
+            if self.server_thread and self.server_thread.isRunning():
+                self.log(f"Port updated to {new_port}. The server is moving to it without a restart.")
+            else:
+                self.log(f"Port updated to {new_port}")
+            QMessageBox.information(self, "Success", f"Port updated to {new_port}.")
             
         except ValueError:
             QMessageBox.warning(self, "Invalid Port", "Please enter a valid port number")
@@ -542,18 +649,13 @@ class DashboardWindow(QMainWindow):
             
             self.server_manager.port = port
             logger.info(f"Server manager port set to {port}")
-            
-            # Set log callback to receive server logs
-            try:
-                from server import set_log_callback
-                set_log_callback(self.log)
-                logger.info("Log callback set successfully")
-            except Exception as e:
-                logger.warning(f"Could not set log callback: {e}")
+            # A tether plugged in since the last refresh should show up in the URL right away
+            network.request_refresh()
             
             # Create and start server thread
             logger.info("Creating server thread")
             self.server_thread = ServerThread(self.server_manager)
+            self.server_thread.finished.connect(self.on_server_stopped)
             self.server_thread.start()
             logger.info("Server thread started")
             
@@ -561,6 +663,8 @@ class DashboardWindow(QMainWindow):
             self.status_label.setStyleSheet("font-size: 14px; font-weight: bold; color: #00ff00;")
             self.start_stop_btn.setText("Stop Server")
             self.tray_start_action.setText("Stop Server")
+            self.restart_btn.setEnabled(True)
+            self.tray_restart_action.setEnabled(True)
             
             self.start_time = datetime.now()
             self.log(f"Server started on port {port}")
@@ -589,36 +693,20 @@ class DashboardWindow(QMainWindow):
             self.log(f"Error: {error_msg}")
             
     def stop_server(self):
-        """Stop the FastAPI server"""
+        """Ask the server to stop without blocking the UI; on_server_stopped finishes up"""
         logger.info("Attempting to stop server")
         try:
-            if self.server_thread:
+            if self.server_thread and self.server_thread.isRunning():
+                self.status_label.setText("Stopping...")
+                self.status_label.setStyleSheet("font-size: 14px; font-weight: bold; color: #ffaa00;")
+                self.start_stop_btn.setEnabled(False)
+                self.restart_btn.setEnabled(False)
+                self.tray_restart_action.setEnabled(False)
                 logger.info("Stopping server manager")
-                self.server_manager.stop()
-                logger.info("Quitting server thread")
-                self.server_thread.quit()
-                logger.info("Waiting for server thread to finish")
-                self.server_thread.wait()
-                logger.info("Server thread stopped")
+                self.server_manager.stop_async()
+            else:
+                self.on_server_stopped()
                 
-            self.status_label.setText("Stopped")
-            self.status_label.setStyleSheet("font-size: 14px; font-weight: bold; color: #ff0000;")
-            self.start_stop_btn.setText("Start Server")
-            self.tray_start_action.setText("Start Server")
-            
-            self.start_time = None
-            self.uptime_label.setText("Uptime: --:--:--")
-            self.log("Server stopped")
-            logger.info("Server stopped successfully")
-            
-            if hasattr(self, 'tray_icon') and self.tray_icon.isVisible():
-                self.tray_icon.showMessage(
-                    "Keyote Server",
-                    "Server stopped",
-                    QSystemTrayIcon.MessageIcon.Information,
-                    2000
-                )
-            
         except Exception as e:
             error_msg = f"Error stopping server: {str(e)}"
             logger.error(error_msg)
@@ -627,14 +715,104 @@ class DashboardWindow(QMainWindow):
                 f"{error_msg}\n\nCheck {LOG_FILE} for details.")
             self.log(error_msg)
             
+    def on_server_stopped(self):
+        """Server thread finished, whether stopped from here or after a failed start"""
+        logger.info("Server thread stopped")
+        self.status_label.setText("Stopped")
+        self.status_label.setStyleSheet("font-size: 14px; font-weight: bold; color: #ff0000;")
+        self.start_stop_btn.setText("Start Server")
+        self.start_stop_btn.setEnabled(True)
+        self.tray_start_action.setText("Start Server")
+        self.restart_btn.setEnabled(False)
+        self.tray_restart_action.setEnabled(False)
+        
+        self.start_time = None
+        self.uptime_label.setText("Uptime: --:--:--")
+        self.connections_label.setText("Connections: 0 active")
+        self.connections_label.setToolTip("")
+        self.log("Server stopped")
+        logger.info("Server stopped successfully")
+        
+        if self._quitting:
+            self.finish_quit()
+        elif hasattr(self, 'tray_icon') and self.tray_icon.isVisible():
+            self.tray_icon.showMessage(
+                "Keyote Server",
+                "Server stopped",
+                QSystemTrayIcon.MessageIcon.Information,
+                2000
+            )
+            
+    def restart_server(self):
+        """Re-apply config.json to the running server in place, without blocking the UI"""
+        if not (self.server_thread and self.server_thread.isRunning()):
+            self.start_server()
+            return
+        self.restart_btn.setEnabled(False)
+        self.tray_restart_action.setEnabled(False)
+        self.log("Restarting server...")
+        future = self.server_manager.restart_async()
+        future.add_done_callback(self.restart_finished.emit)
+        
+    def on_restart_finished(self, future):
+        running = bool(self.server_thread and self.server_thread.isRunning())
+        self.restart_btn.setEnabled(running)
+        self.tray_restart_action.setEnabled(running)
+        try:
+            elapsed = future.result()
+        except Exception as e:
+            logger.error(f"Restart failed: {e}")
+            self.log(f"Restart failed: {e}")
+            return
+        self.log(f"Server restarted in {elapsed * 1000:.0f} ms")
+            
     def update_uptime(self):
         """Update uptime display"""
+        self.update_network()
+        self.report_startup_profile()
         if self.start_time:
             uptime = datetime.now() - self.start_time
             hours = uptime.seconds // 3600
             minutes = (uptime.seconds % 3600) // 60
             seconds = uptime.seconds % 60
             self.uptime_label.setText(f"Uptime: {hours:02d}:{minutes:02d}:{seconds:02d}")
+            self.update_latency()
+            self.update_sessions()
+
+    def report_startup_profile(self):
+        """With KEYOTE_PROFILE_STARTUP=1, log the startup timeline once the first key is injected"""
+        if (not profile.enabled or self._profile_reported or self.server_module is None
+                or self.server_module.injector.first_injected_at is None):
+            return
+        self._profile_reported = True
+        logger.info(self.server_module.startup_report())
+
+    def update_sessions(self):
+        """Show connected clients, with per-client rate and backlog in the tooltip"""
+        server_module = self.server_module
+        if server_module is None:
+            return
+        rows = server_module.sessions.snapshot(server_module.injector.pending_by_client())
+        self.connections_label.setText(f"Connections: {len(rows)} active")
+        self.connections_label.setToolTip("\n".join(
+            f"{row['client']} ({row['transport']}): {row['keys_per_second']:.1f} keys/s, "
+            f"{row['keys']} keys, {row['pending']} queued, idle {row['idle_for']:.0f}s"
+            for row in rows
+        ))
+            
+    def update_latency(self):
+        """Show per-stage key latency (p50/p95/p99/max, ms) from the running server"""
+        server_module = self.server_module
+        if server_module is None:
+            return
+        rows = [
+            f"{stage:<8} {s['p50']:>7.2f} {s['p95']:>7.2f} {s['p99']:>7.2f} {s['max']:>7.2f}"
+            for stage, s in server_module.latency.summary().items()
+            if s['count']
+        ]
+        if rows:
+            header = f"{'stage':<8} {'p50':>7} {'p95':>7} {'p99':>7} {'max':>7}  (ms)"
+            self.latency_label.setText("\n".join([header] + rows))
             
     def open_settings(self):
         """Open settings dialog"""
@@ -651,6 +829,52 @@ class DashboardWindow(QMainWindow):
         timestamp = datetime.now().strftime("%H:%M:%S")
         self.log_display.append(f"[{timestamp}] {message}")
         
+    def drain_server_log(self):
+        """Move queued server log events into the activity log, coalescing typing bursts"""
+        server_module = self.server_module
+        if server_module is None:
+            return
+            
+        lines = []
+        for ts, kind, message in server_module.drain_log_events(LOG_DRAIN_BATCH):
+            if kind == "key":
+                if self._key_burst and ts - self._key_burst[1] > KEY_BURST_GAP:
+                    lines.extend(self._flush_key_burst())
+                if self._key_burst is None:
+                    self._key_burst = [ts, ts, 0, []]
+                self._key_burst[1] = ts
+                self._key_burst[2] += 1
+                if len(self._key_burst[3]) < KEY_BURST_MIN:
+                    self._key_burst[3].append((ts, message))
+                continue
+            lines.extend(self._flush_key_burst())
+            lines.append(self._format_log_line(ts, message))
+            
+        if self._key_burst and time.time() - self._key_burst[1] > KEY_BURST_GAP:
+            lines.extend(self._flush_key_burst())
+            
+        dropped = server_module.log_events_dropped - self._log_dropped_seen
+        if dropped > 0:
+            self._log_dropped_seen += dropped
+            lines.append(self._format_log_line(time.time(), f"{dropped} log events dropped (log overloaded)"))
+            
+        if lines:
+            self.log_display.append("\n".join(lines))
+            
+    def _flush_key_burst(self) -> list:
+        """Render the pending typing burst as individual lines or one summary line"""
+        if self._key_burst is None:
+            return []
+        first, last, count, samples = self._key_burst
+        self._key_burst = None
+        if count < KEY_BURST_MIN:
+            return [self._format_log_line(ts, message) for ts, message in samples]
+        return [self._format_log_line(first, f"Mobile → typed {count} keys in {last - first:.1f}s")]
+        
+    @staticmethod
+    def _format_log_line(ts: float, message: str) -> str:
+        return f"[{datetime.fromtimestamp(ts).strftime('%H:%M:%S')}] {message}"
+        
     def quit_application(self):
         """Quit application completely"""
         reply = QMessageBox.question(
@@ -662,14 +886,19 @@ class DashboardWindow(QMainWindow):
         
         if reply == QMessageBox.StandardButton.Yes:
             if self.server_thread and self.server_thread.isRunning():
+                # Quit once the server has stopped (bounded by its shutdown deadline)
+                self._quitting = True
                 self.stop_server()
-            
-            # Hide and cleanup tray icon before quitting
-            if hasattr(self, 'tray_icon'):
-                self.tray_icon.hide()
-                self.tray_icon.deleteLater()
-            
-            QApplication.quit()
+            else:
+                self.finish_quit()
+                
+    def finish_quit(self):
+        # Hide and cleanup tray icon before quitting
+        if hasattr(self, 'tray_icon'):
+            self.tray_icon.hide()
+            self.tray_icon.deleteLater()
+        
+        QApplication.quit()
 
 
 def main():
@@ -727,11 +956,13 @@ def main():
         
         # Set quit on last window closed to False (app stays in tray)
         app.setQuitOnLastWindowClosed(False)
+        profile.mark("QApplication created")
         logger.info("QApplication created")
         
         logger.info("Creating DashboardWindow")
         window = DashboardWindow()
         window.show()
+        profile.mark("window shown")
         logger.info("DashboardWindow shown")
         
         logger.info("Starting event loop")
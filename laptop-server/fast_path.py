@@ -0,0 +1,157 @@
+"""
+Fast Path - Lean raw-ASGI handling of POST /key
+Runs ahead of FastAPI's middleware, routing and pydantic for well-formed key requests. The body is
+size-checked while it streams in, decoded with orjson when available into a slotted object, and
+answered with a preencoded response. Anything unusual (invalid input, CORS requests, other routes)
+is replayed to the full FastAPI app, so error responses stay exactly as before.
+"""
+
+import json
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:  # optional dependency
+    json_loads = json.loads
+
+EVENTS = frozenset(('press', 'down', 'up'))
+
+# Request headers the fast path reads; everything else is ignored
+WANTED_HEADERS = frozenset((b'content-type', b'content-length', b'origin', b'x-keyote-client', b'x-keyote-sent-at'))
+
+PAYLOAD_TOO_LARGE = b'{"error":"Payload too large"}'
+
+
+class KeyRequest:
+    """A /key JSON body that passed the same checks as server.KeyCommand"""
+
+    __slots__ = ('key', 'ctrl', 'shift', 'alt', 'repeat', 'event', 'wait', 'sent_at')
+
+    def __init__(self, key: str, ctrl: bool, shift: bool, alt: bool, repeat: int,
+                 event: str, wait: bool, sent_at: Optional[float]):
+        self.key = key
+        self.ctrl = ctrl
+        self.shift = shift
+        self.alt = alt
+        self.repeat = repeat
+        self.event = event
+        self.wait = wait
+        self.sent_at = sent_at
+
+
+def parse_key_request(body: bytes) -> Optional[KeyRequest]:
+    """Strictly typed decode of a /key JSON body; None means 'let pydantic handle it'"""
+    try:
+        data = json_loads(body)
+    except ValueError:
+        return None
+    if type(data) is not dict:
+        return None
+    key = data.get('key')
+    ctrl = data.get('ctrl', False)
+    shift = data.get('shift', False)
+    alt = data.get('alt', False)
+    repeat = data.get('repeat', 1)
+    event = data.get('event', 'press')
+    wait = data.get('wait', False)
+    sent_at = data.get('sent_at')
+    if (type(key) is not str or not 1 <= len(key) <= 20
+            or type(ctrl) is not bool or type(shift) is not bool or type(alt) is not bool
+            or type(wait) is not bool or type(repeat) is not int or not 1 <= repeat <= 100
+            or event not in EVENTS
+            or (sent_at is not None and type(sent_at) not in (int, float))):
+        return None
+    return KeyRequest(key, ctrl, shift, alt, repeat, event, wait, sent_at)
+
+
+def encode_json(content: Any) -> bytes:
+    """Same bytes as starlette's JSONResponse"""
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(',', ':')).encode()
+
+
+@lru_cache(maxsize=2048)
+def encode_key_response(status: str, key: str) -> bytes:
+    """Response body for a key result, encoded once per (status, key)"""
+    return encode_json({"status": status, "key": key})
+
+
+# handle(body, headers, client_ip) -> (status, body, extra headers), or None to delegate to the app
+KeyHandler = Callable[[bytes, Dict[bytes, bytes], str], Awaitable[Optional[Tuple[int, bytes, List[Tuple[bytes, bytes]]]]]]
+
+
+class KeyFastPath:
+    """ASGI middleware answering POST /key directly and passing everything else to `app`"""
+
+    def __init__(self, app, handle: KeyHandler, max_body: Callable[[], int],
+                 common_headers: Optional[Callable[[], List[Tuple[bytes, bytes]]]] = None, path: str = "/key"):
+        self.app = app
+        self.handle = handle
+        self.max_body = max_body
+        # Headers added to every fast-path response (e.g. the queue depth)
+        self.common_headers = common_headers
+        self.path = path
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] != self.path or scope["method"] != "POST":
+            return await self.app(scope, receive, send)
+
+        headers: Dict[bytes, bytes] = {}
+        for name, value in scope["headers"]:
+            if name in WANTED_HEADERS:
+                headers[name] = value
+        # Browser requests need CORS headers; leave them to the full stack
+        if b'origin' in headers:
+            return await self.app(scope, receive, send)
+
+        limit = self.max_body()
+        content_length = headers.get(b'content-length')
+        if content_length is not None and content_length.isdigit() and int(content_length) > limit:
+            return await self._respond(send, 413, PAYLOAD_TOO_LARGE)
+
+        chunks = []
+        size = 0
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            chunk = message.get("body", b"")
+            size += len(chunk)
+            if size > limit:
+                return await self._respond(send, 413, PAYLOAD_TOO_LARGE)
+            chunks.append(chunk)
+            more_body = message.get("more_body", False)
+        body = chunks[0] if len(chunks) == 1 else b"".join(chunks)
+
+        client = scope.get("client")
+        result = await self.handle(body, headers, client[0] if client else "unknown")
+        if result is None:
+            return await self.app(scope, _replay(body, receive), send)
+        status, payload, extra_headers = result
+        await self._respond(send, status, payload, extra_headers)
+
+    async def _respond(self, send, status: int, payload: bytes,
+                       extra_headers: Optional[List[Tuple[bytes, bytes]]] = None):
+        headers = [(b"content-type", b"application/json"), (b"content-length", str(len(payload)).encode())]
+        if self.common_headers:
+            headers.extend(self.common_headers())
+        if extra_headers:
+            headers.extend(extra_headers)
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": payload})
+
+
+def _replay(body: bytes, receive):
+    """receive() that hands the already-read body to the downstream app"""
+    sent = False
+
+    async def replay():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        return await receive()
+
+    return replay
@@ -0,0 +1,500 @@
+"""
+Injection Worker - Runs keystroke injection on a dedicated thread
+Keeps blocking pynput calls off the asyncio event loop. Each client's keys keep their order,
+and clients take turns so one busy sender cannot starve the others. When a backlog builds
+up, a client's consecutive key jobs are coalesced and injected as one run; while other clients
+are waiting, a turn is kept short and long jobs are continued on the client's next turn. A
+paced task parks between steps instead of sleeping, so the thread serves other clients meanwhile.
+"""
+
+import threading
+import time
+import logging
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from typing import Any, Callable, Deque, Dict, FrozenSet, Generator, Iterable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Delay between repeated presses of the same command (seconds)
+REPEAT_INTERVAL = 0.01
+# Most queued key jobs taken into one coalesced run
+MAX_RUN = 256
+# Most key presses in one turn while other clients have queued work; a job with more repeats
+# is continued on the client's next turn
+TURN_PRESSES = 8
+# Queue of control actions (e.g. a backend swap), served ahead of every client
+CONTROL_CLIENT = "\0control"
+
+# (key, ctrl, shift, alt, count)
+KeyRun = Sequence[Tuple[str, bool, bool, bool, int]]
+
+
+class QueueFullError(RuntimeError):
+    """Raised by submit when accepting the work would exceed the worker's pending limit"""
+
+    def __init__(self, pending: int, limit: int):
+        super().__init__(f"Injection queue full: {pending} pending, limit {limit}")
+        self.pending = pending
+        self.limit = limit
+
+    @property
+    def retry_after(self) -> int:
+        """Rough whole seconds until the backlog has drained"""
+        return max(1, int(self.pending * REPEAT_INTERVAL + 0.999))
+
+
+class RequestTooLargeError(QueueFullError):
+    """Raised by submit when the work alone is more than the pending limit, so it can never be admitted"""
+
+    def __init__(self, presses: int, limit: int):
+        RuntimeError.__init__(self, f"Request of {presses} key presses exceeds the pending limit of {limit}")
+        self.pending = 0
+        self.limit = limit
+        self.presses = presses
+
+
+class Reservation:
+    """Room admitted up front for a batch whose jobs are queued one by one (see InjectionWorker.reserve)
+
+    Its submit takes the same arguments as InjectionWorker.submit, queues without an admission
+    check, and draws on the reserved presses; release() gives back what was not used.
+    """
+
+    def __init__(self, worker: "InjectionWorker", client: str, presses: int):
+        self.worker = worker
+        self.client = client
+        self.remaining = presses
+
+    def submit(self, key: str, ctrl: bool = False, shift: bool = False,
+               alt: bool = False, repeat: int = 1, client: str = "") -> Future:
+        if client != self.client or repeat > self.remaining:
+            raise ValueError(f"Reservation for {self.client!r} has no room for {repeat} presses of {client!r}")
+        job = InjectionJob(key, ctrl, shift, alt, repeat)
+        with self.worker._cond:
+            self.remaining -= repeat
+            self.worker._enqueue(client, (job,))
+        return job.future
+
+    def release(self):
+        """Return the unused presses to the pending limits"""
+        with self.worker._cond:
+            if self.remaining:
+                self.worker._release(self.client, self.remaining)
+                self.remaining = 0
+
+
+class InjectionJob:
+    """A queued key command (or custom action) and the future resolved once it has run"""
+
+    __slots__ = ('key', 'ctrl', 'shift', 'alt', 'repeat', 'action', 'steps', 'done', 'resume_at', 'future',
+                 'enqueued_ns')
+
+    def __init__(self, key: str, ctrl: bool = False, shift: bool = False,
+                 alt: bool = False, repeat: int = 1, action: Optional[Callable[[], Any]] = None):
+        self.key = key
+        self.ctrl = ctrl
+        self.shift = shift
+        self.alt = alt
+        self.repeat = repeat
+        self.action = action
+        # Generator advanced one step per turn (see InjectionWorker.submit_steps)
+        self.steps: Optional[Generator[Optional[float], None, Any]] = None
+        # Repeats already injected, when the job is split across turns
+        self.done = 0
+        # perf_counter() time before which a parked step job is not continued (0 = ready)
+        self.resume_at = 0.0
+        self.future: Future = Future()
+        self.enqueued_ns = time.perf_counter_ns()
+
+
+class InjectionWorker:
+    """Executes key commands on its own thread: FIFO per client, clients served round-robin"""
+
+    def __init__(self, press_fn: Callable[[str, bool, bool, bool], bool], latency=None,
+                 run_fn: Optional[Callable[[KeyRun], List[bool]]] = None, max_pending: int = 0,
+                 max_pending_per_client: int = 0):
+        self.press_fn = press_fn
+        # Injects a backlog of commands in one pass, returning success per command; without it
+        # every job is pressed on its own
+        self.run_fn = run_fn
+        # Optional StageLatency receiving "queue" (wait) and "inject" (execution) timings
+        self.latency = latency
+        # One FIFO per client; dict order is the round-robin order, the next client to serve first
+        self._queues: "OrderedDict[str, Deque[InjectionJob]]" = OrderedDict()
+        self._depth = 0
+        # Admission limits on queued key presses (repeats count individually; 0 = unlimited)
+        self.max_pending = max_pending
+        self.max_pending_per_client = max_pending_per_client
+        self._pending = 0
+        self._client_pending: Dict[str, int] = {}
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+        # Bumped by every start; a thread left over from an earlier run exits once it sees a newer one
+        self._generation = 0
+        # Written only by the worker thread, so no lock is needed to keep them consistent
+        self.injected = 0
+        self.failed = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.rejected = 0
+        # perf_counter() time of the first successful injection, for startup profiling
+        self.first_injected_at: Optional[float] = None
+        # Opt-in freshness policy: queued jobs for these keys older than stale_after_ns are dropped
+        self.stale_keys: FrozenSet[str] = frozenset()
+        self.stale_after_ns = 0
+
+    @property
+    def depth(self) -> int:
+        """Number of jobs waiting to be injected"""
+        return self._depth
+
+    @property
+    def pending(self) -> int:
+        """Key presses waiting to be injected, the quantity max_pending limits"""
+        return self._pending
+
+    def pending_by_client(self) -> Dict[str, int]:
+        """Snapshot of queued key presses per client"""
+        with self._cond:
+            return dict(self._client_pending)
+
+    def start(self):
+        """Start the worker thread (no-op if already running)
+
+        If the previous thread is still finishing a long job (stop timed out), the new thread
+        waits for it to exit before taking jobs, so the queues never have two consumers.
+        """
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+            self._generation += 1
+            previous = self._thread if self._thread and self._thread.is_alive() else None
+            self._thread = threading.Thread(
+                target=self._run, args=(self._generation, previous), name="keyote-injector", daemon=True
+            )
+            self._thread.start()
+        logger.info("Injection worker started")
+
+    def stop(self, timeout: float = 2.0):
+        """Stop the worker thread; jobs still queued are kept for the next start"""
+        with self._cond:
+            if not self._running:
+                return
+            self._running = False
+            self._cond.notify_all()
+            thread = self._thread
+        if thread:
+            thread.join(timeout)
+            if thread.is_alive():
+                logger.warning("Injection worker still finishing a job; it exits when the job ends")
+                return
+        logger.info("Injection worker stopped")
+
+    def submit(self, key: str, ctrl: bool = False, shift: bool = False,
+               alt: bool = False, repeat: int = 1, client: str = "") -> Future:
+        """Queue a key command; the returned future resolves to press_key's result"""
+        job = InjectionJob(key, ctrl, shift, alt, repeat)
+        with self._cond:
+            self._admit(repeat, client)
+            self._enqueue(client, (job,))
+        return job.future
+
+    def submit_call(self, action: Callable[[], Any], label: str = "action", client: str = "",
+                    weight: int = 1) -> Future:
+        """Queue an arbitrary callable to run in order with the client's keys; resolves to its return value
+
+        `weight` is the work's size in key presses, counted against the pending limits (see _weigh).
+        """
+        job = InjectionJob(label, action=action)
+        with self._cond:
+            job.repeat = self._weigh(weight)
+            self._admit(job.repeat, client)
+            self._enqueue(client, (job,))
+        return job.future
+
+    def submit_steps(self, steps: Generator[Optional[float], None, Any], label: str = "task",
+                     client: str = "", weight: int = 1) -> Future:
+        """Queue a long task as a generator advanced one step per turn, so other clients get turns
+        in between; resolves to the generator's return value
+
+        A step may yield a perf_counter() deadline: the job is parked until then, without holding
+        the thread, and the client's later jobs wait behind it. `weight` is the number of steps,
+        counted against the pending limits (see _weigh) and released one per step as the task runs.
+        """
+        job = InjectionJob(label)
+        job.steps = steps
+        with self._cond:
+            job.repeat = self._weigh(weight)
+            self._admit(job.repeat, client)
+            self._enqueue(client, (job,))
+        return job.future
+
+    def run_next(self, action: Callable[[], Any], label: str = "control") -> Future:
+        """Run a control action before any queued key, bypassing the admission limits"""
+        job = InjectionJob(label, action=action)
+        with self._cond:
+            self._pending += job.repeat
+            self._client_pending[CONTROL_CLIENT] = self._client_pending.get(CONTROL_CLIENT, 0) + job.repeat
+            self._enqueue(CONTROL_CLIENT, (job,))
+            self._queues.move_to_end(CONTROL_CLIENT, last=False)
+        return job.future
+
+    def submit_many(self, commands: Iterable[Tuple[str, bool, bool, bool, int]],
+                    client: str = "") -> List[Future]:
+        """Queue several (key, ctrl, shift, alt, repeat) commands back to back, in order (all or none)"""
+        jobs = [InjectionJob(*command) for command in commands]
+        with self._cond:
+            self._admit(sum(job.repeat for job in jobs), client)
+            self._enqueue(client, jobs)
+        return [job.future for job in jobs]
+
+    def reserve(self, presses: int, client: str = "") -> Reservation:
+        """Admit `presses` for the client now, or raise QueueFullError; the batch then queued
+        through the reservation cannot be refused part-way. Release it once the batch is queued."""
+        with self._cond:
+            self._admit(presses, client)
+        return Reservation(self, client, presses)
+
+    @property
+    def admission_limit(self) -> int:
+        """Most presses one submission may carry: the tighter of the two pending limits (0 = unlimited)"""
+        return min(filter(None, (self.max_pending, self.max_pending_per_client)), default=0)
+
+    def _weigh(self, weight: int) -> int:
+        """Pending weight of a custom job (caller holds the lock)
+
+        A job heavier than the admission limit counts as the whole limit, so it is admitted once
+        the backlog ahead of it has drained instead of being refused outright.
+        """
+        limit = self.admission_limit
+        return max(1, min(weight, limit) if limit else weight)
+
+    def _check_room(self, presses: int, client: str):
+        limit = self.admission_limit
+        if limit and presses > limit:
+            self.rejected += 1
+            raise RequestTooLargeError(presses, limit)
+        if self.max_pending and self._pending + presses > self.max_pending:
+            self.rejected += 1
+            raise QueueFullError(self._pending, self.max_pending)
+        client_pending = self._client_pending.get(client, 0)
+        if self.max_pending_per_client and client_pending + presses > self.max_pending_per_client:
+            self.rejected += 1
+            raise QueueFullError(client_pending, self.max_pending_per_client)
+
+    def _admit(self, presses: int, client: str):
+        """Reserve room for `presses` more queued presses (caller holds the lock)"""
+        self._check_room(presses, client)
+        self._pending += presses
+        self._client_pending[client] = self._client_pending.get(client, 0) + presses
+
+    def _enqueue(self, client: str, jobs: Iterable[InjectionJob]):
+        """Append to the client's FIFO (caller holds the lock); a new client joins the end of the rotation"""
+        queue = self._queues.get(client)
+        if queue is None:
+            queue = self._queues[client] = deque()
+        before = len(queue)
+        queue.extend(jobs)
+        self._depth += len(queue) - before
+        self._cond.notify()
+
+    def _pop(self, client: str, queue: Deque[InjectionJob]) -> InjectionJob:
+        job = queue.popleft()
+        self._depth -= 1
+        self._release(client, job.repeat - job.done)
+        return job
+
+    def _release(self, client: str, presses: int):
+        """Give back `presses` admitted for the client (caller holds the lock)"""
+        self._pending -= presses
+        remaining = self._client_pending[client] - presses
+        if remaining:
+            self._client_pending[client] = remaining
+        else:
+            del self._client_pending[client]
+
+    def _resume(self, client: str, job: InjectionJob):
+        """Put an unfinished job back at the head of its client's queue, to continue next turn"""
+        with self._cond:
+            presses = job.repeat - job.done
+            self._pending += presses
+            self._client_pending[client] = self._client_pending.get(client, 0) + presses
+            queue = self._queues.get(client)
+            if queue is None:
+                queue = self._queues[client] = deque()
+            queue.appendleft(job)
+            self._depth += 1
+            self._cond.notify()
+
+    def _run(self, generation: int, previous: Optional[threading.Thread] = None):
+        if previous:
+            previous.join()
+        while True:
+            with self._cond:
+                while True:
+                    if not self._running or generation != self._generation:
+                        return
+                    client, queue, wait = self._next_client()
+                    if queue is not None:
+                        break
+                    self._cond.wait(wait)
+                # Serve the first ready client in the rotation, then move it to the back
+                contended = len(self._queues) > 1
+                job = self._pop(client, queue)
+                run = None
+                if self.run_fn and queue and not job.done:
+                    run = self._take_run(job, client, queue, contended)
+                if queue:
+                    self._queues.move_to_end(client)
+                else:
+                    del self._queues[client]
+            if run:
+                self._execute_run(run)
+            else:
+                self._execute(job, client, TURN_PRESSES if contended else 0)
+
+    def _next_client(self) -> Tuple[str, Optional[Deque[InjectionJob]], Optional[float]]:
+        """First client in the rotation whose next job is not parked (caller holds the lock);
+        otherwise no queue and the seconds until the earliest parked job is due (None if idle)"""
+        now = time.perf_counter()
+        wait: Optional[float] = None
+        for client, queue in self._queues.items():
+            delay = queue[0].resume_at - now
+            if delay <= 0:
+                return client, queue, None
+            wait = delay if wait is None else min(wait, delay)
+        return "", None, wait
+
+    def _take_run(self, first: InjectionJob, client: str, queue: Deque[InjectionJob],
+                  contended: bool = False) -> Optional[List[InjectionJob]]:
+        """Pop the client's key jobs queued behind `first` (caller holds the lock); None if there is no run
+
+        While other clients wait, a run stays within TURN_PRESSES presses and holds at most one
+        composite shortcut, whose modifier settle delays make it the slow part of a run.
+        """
+        if not _is_key(first) or not _is_key(queue[0]):
+            return None
+        if contended and first.repeat > TURN_PRESSES:
+            return None
+        run = [first]
+        presses = first.repeat
+        shortcut = _is_shortcut(first)
+        while queue and _is_key(queue[0]) and len(run) < MAX_RUN:
+            if contended:
+                following = queue[0]
+                if presses + following.repeat > TURN_PRESSES or (shortcut and _is_shortcut(following)):
+                    break
+                presses += following.repeat
+                shortcut = shortcut or _is_shortcut(following)
+            run.append(self._pop(client, queue))
+        return run if len(run) > 1 else None
+
+    def _is_stale(self, job: InjectionJob, now_ns: int) -> bool:
+        return (self.stale_after_ns > 0 and now_ns - job.enqueued_ns > self.stale_after_ns
+                and job.key.lower() in self.stale_keys)
+
+    def _execute_run(self, jobs: List[InjectionJob]):
+        """Inject a backlog of key jobs in one pass, merging adjacent identical commands"""
+        started_ns = time.perf_counter_ns()
+        groups: List[List[InjectionJob]] = []
+        for job in jobs:
+            if not job.future.set_running_or_notify_cancel():
+                continue
+            if self.latency:
+                self.latency.record("queue", started_ns - job.enqueued_ns)
+            if self._is_stale(job, started_ns):
+                self.dropped += 1
+                job.future.set_result(False)
+                continue
+            if groups and _same_command(groups[-1][0], job):
+                groups[-1].append(job)
+                self.coalesced += 1
+            else:
+                groups.append([job])
+        if not groups:
+            return
+
+        commands = [(g[0].key, g[0].ctrl, g[0].shift, g[0].alt, sum(j.repeat for j in g)) for g in groups]
+        try:
+            results = self.run_fn(commands)
+        except Exception as e:
+            logger.error(f"Injection worker error for a run of {len(commands)} commands: {e}")
+            results = [False] * len(commands)
+        for group, command, success in zip(groups, commands, results):
+            if success:
+                self.injected += command[4]
+                if self.first_injected_at is None:
+                    self.first_injected_at = time.perf_counter()
+            else:
+                self.failed += len(group)
+            for job in group:
+                job.future.set_result(success)
+        if self.latency:
+            self.latency.record("inject", time.perf_counter_ns() - started_ns)
+
+    def _execute(self, job: InjectionJob, client: str = "", max_presses: int = 0):
+        """Run a job, or with max_presses only that many of its repeats; unfinished jobs are resumed"""
+        resumed = job.future.running()
+        if not resumed and not job.future.set_running_or_notify_cancel():
+            return
+        started_ns = time.perf_counter_ns()
+        if self.latency and not resumed:
+            self.latency.record("queue", started_ns - job.enqueued_ns)
+        if _is_key(job) and not resumed and self._is_stale(job, started_ns):
+            self.dropped += 1
+            job.future.set_result(False)
+            return
+        try:
+            self._inject(job, max_presses)
+        finally:
+            if self.latency and _is_key(job):
+                self.latency.record("inject", time.perf_counter_ns() - started_ns)
+        if not job.future.done():
+            self._resume(client, job)
+
+    def _inject(self, job: InjectionJob, max_presses: int = 0):
+        try:
+            if job.action is not None:
+                job.future.set_result(job.action())
+                return
+            if job.steps is not None:
+                try:
+                    job.resume_at = next(job.steps) or 0.0
+                    # Release the step's share of the weight; the rest is re-queued by _resume
+                    job.done = min(job.done + 1, job.repeat - 1)
+                except StopIteration as result:
+                    job.future.set_result(result.value)
+                return
+            end = job.repeat if not max_presses else min(job.repeat, job.done + max_presses)
+            while job.done < end:
+                if not self.press_fn(job.key, job.ctrl, job.shift, job.alt):
+                    self.failed += 1
+                    job.future.set_result(False)
+                    return
+                job.done += 1
+                self.injected += 1
+                if self.first_injected_at is None:
+                    self.first_injected_at = time.perf_counter()
+                if job.done < end:
+                    time.sleep(REPEAT_INTERVAL)
+            if job.done == job.repeat:
+                job.future.set_result(True)
+        except Exception as e:
+            logger.error(f"Injection worker error for key '{job.key}': {e}")
+            job.future.set_exception(e)
+
+
+def _is_key(job: InjectionJob) -> bool:
+    return job.action is None and job.steps is None
+
+
+def _is_shortcut(job: InjectionJob) -> bool:
+    """Composite shortcut such as "alt+tab" (a lone "+" is just the plus key)"""
+    return '+' in job.key and len(job.key) > 1
+
+
+def _same_command(a: InjectionJob, b: InjectionJob) -> bool:
+    return a.key == b.key and a.ctrl == b.ctrl and a.shift == b.shift and a.alt == b.alt
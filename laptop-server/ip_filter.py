@@ -0,0 +1,130 @@
+"""
+IP Filter - Enforces config.allowed_ips for every transport
+Entries (single addresses or CIDR ranges) are compiled into per-prefix-length hash sets, and
+decisions are cached per client address so the accepted path is a single dict lookup.
+"""
+
+import ipaddress
+import json
+import logging
+from typing import Callable, Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Distinct client addresses whose decision is remembered before the cache is reset
+MAX_CACHE = 4096
+
+# version -> [(netmask as int, network addresses as ints)], most specific prefix first
+PrefixTable = Dict[int, List[Tuple[int, FrozenSet[int]]]]
+
+
+def compile_networks(entries: Iterable[str]) -> Tuple[PrefixTable, List[str]]:
+    """Group entries by prefix length; returns the table and the entries that failed to parse"""
+    grouped: Dict[Tuple[int, int], set] = {}
+    invalid = []
+    for entry in entries:
+        try:
+            network = ipaddress.ip_network(str(entry).strip(), strict=False)
+        except ValueError:
+            invalid.append(entry)
+            continue
+        grouped.setdefault((network.version, network.prefixlen), set()).add(int(network.network_address))
+
+    table: PrefixTable = {4: [], 6: []}
+    for (version, prefixlen), networks in sorted(grouped.items(), key=lambda item: -item[0][1]):
+        bits = 32 if version == 4 else 128
+        mask = ((1 << prefixlen) - 1) << (bits - prefixlen)
+        table[version].append((mask, frozenset(networks)))
+    return table, invalid
+
+
+class _Decisions:
+    """A compiled allow list and the decisions cached against it, replaced together on update"""
+
+    __slots__ = ('open', 'table', 'cache')
+
+    def __init__(self, open: bool, table: PrefixTable):
+        self.open = open
+        self.table = table
+        self.cache: Dict[str, bool] = {}
+
+
+class IPAllowList:
+    """Answers whether a client address may use the server; an empty list allows everyone"""
+
+    def __init__(self, entries: Iterable[str] = ()):
+        self.blocked = 0
+        self.update(entries)
+
+    def update(self, entries: Iterable[str]):
+        """Recompile from config and drop every cached decision"""
+        entries = list(entries or [])
+        table, invalid = compile_networks(entries)
+        for entry in invalid:
+            logger.warning(f"Ignoring invalid allowed_ips entry: {entry!r}")
+        self.entries = entries
+        # One assignment, so a concurrent allows() caches its decision against the table it used
+        self._state = _Decisions(not entries, table)
+
+    @property
+    def open(self) -> bool:
+        """True when allowed_ips is empty, so every client is allowed"""
+        return self._state.open
+
+    def allows(self, host: str) -> bool:
+        state = self._state
+        decision = state.cache.get(host)
+        if decision is None:
+            decision = _decide(state, host)
+            if len(state.cache) >= MAX_CACHE:
+                state.cache.clear()
+            state.cache[host] = decision
+        if not decision:
+            self.blocked += 1
+        return decision
+
+
+def _decide(state: _Decisions, host: str) -> bool:
+    if state.open:
+        return True
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    if address.version == 6 and address.ipv4_mapped:
+        address = address.ipv4_mapped
+    value = int(address)
+    return any((value & mask) in networks for mask, networks in state.table[address.version])
+
+
+class AllowedIPsMiddleware:
+    """ASGI middleware rejecting HTTP and WebSocket clients outside the allow list before the app runs"""
+
+    def __init__(self, app, allow_list: IPAllowList,
+                 common_headers: Optional[Callable[[], List[Tuple[bytes, bytes]]]] = None):
+        self.app = app
+        self.allow_list = allow_list
+        # Extra headers for the 403 response, e.g. the queue depth every response carries
+        self.common_headers = common_headers
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            return await self.app(scope, receive, send)
+        client = scope.get("client")
+        host = client[0] if client else ""
+        if self.allow_list.allows(host):
+            return await self.app(scope, receive, send)
+
+        if scope["type"] == "websocket":
+            # Closing before accept makes the server answer the handshake with 403
+            await send({"type": "websocket.close", "code": 1008})
+            return
+        body = json.dumps({"detail": f"Client {host} is not in allowed_ips"}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 403,
+            "headers": [(b"content-type", b"application/json"),
+                        (b"content-length", str(len(body)).encode()),
+                        *(self.common_headers() if self.common_headers else ())],
+        })
+        await send({"type": "http.response.body", "body": body})
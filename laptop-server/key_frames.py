@@ -0,0 +1,130 @@
+"""
+Key Frames - Compact fixed-layout binary encoding for key commands
+Decoded with struct into slotted objects, avoiding JSON parsing and pydantic on the hot path
+"""
+
+import struct
+from typing import Iterator, Optional
+
+# Frame layout (network byte order, 10 bytes):
+#   seq      uint32  sequence number (0 when the transport does not use one)
+#   key_id   uint32  Unicode codepoint, or SPECIAL_KEY_BASE + index into SPECIAL_KEY_NAMES
+#   flags    uint8   modifier bits plus FLAG_WAIT and at most one of FLAG_DOWN/FLAG_UP
+#   repeat   uint8   1-100
+FRAME = struct.Struct('!IIBB')
+FRAME_SIZE = FRAME.size
+
+CONTENT_TYPE = "application/x-keyote-frame"
+
+MOD_CTRL = 0x01
+MOD_SHIFT = 0x02
+MOD_ALT = 0x04
+MOD_WIN = 0x08
+# Key-down / key-up events for server-side autorepeat; neither set means a plain press
+FLAG_DOWN = 0x10
+FLAG_UP = 0x20
+FLAG_WAIT = 0x80
+
+SPECIAL_KEY_BASE = 0x110000
+
+# Order is part of the wire format: only ever append to this tuple
+SPECIAL_KEY_NAMES = (
+    'enter', 'backspace', 'delete', 'tab', 'escape', 'space',
+    'up', 'down', 'left', 'right', 'home', 'end', 'pageup', 'pagedown',
+    'capslock', 'win', 'printscreen',
+    'f1', 'f2', 'f3', 'f4', 'f5', 'f6', 'f7', 'f8', 'f9', 'f10', 'f11', 'f12',
+)
+
+KEY_ALIASES = {
+    'return': 'enter',
+    'esc': 'escape',
+    'caps': 'capslock',
+    'cmd': 'win',
+    'prtsc': 'printscreen',
+}
+
+SPECIAL_KEY_IDS = {name: SPECIAL_KEY_BASE + i for i, name in enumerate(SPECIAL_KEY_NAMES)}
+SPECIAL_KEY_IDS.update({alias: SPECIAL_KEY_IDS[name] for alias, name in KEY_ALIASES.items()})
+
+
+class FrameError(ValueError):
+    """Raised for truncated or out-of-range key frames"""
+
+
+class KeyFrame:
+    """Decoded key frame; reusable across decodes to avoid per-frame allocation"""
+
+    __slots__ = ('seq', 'key', 'ctrl', 'shift', 'alt', 'repeat', 'wait', 'event')
+
+    def __init__(self):
+        self.seq = 0
+        self.key = ''
+        self.ctrl = False
+        self.shift = False
+        self.alt = False
+        self.repeat = 1
+        self.wait = False
+        self.event = 'press'
+
+
+def encode_frame(key: str, ctrl: bool = False, shift: bool = False, alt: bool = False,
+                 repeat: int = 1, seq: int = 0, win: bool = False, wait: bool = False,
+                 event: str = 'press') -> bytes:
+    """Encode a key command as a binary frame"""
+    if len(key) == 1:
+        key_id = ord(key)
+    else:
+        key_id = SPECIAL_KEY_IDS.get(key.lower())
+    if key_id is None:
+        raise FrameError(f"Key has no frame encoding: {key!r}")
+    flags = ((MOD_CTRL if ctrl else 0) | (MOD_SHIFT if shift else 0) | (MOD_ALT if alt else 0)
+             | (MOD_WIN if win else 0) | (FLAG_WAIT if wait else 0)
+             | (FLAG_DOWN if event == 'down' else 0) | (FLAG_UP if event == 'up' else 0))
+    return FRAME.pack(seq, key_id, flags, repeat)
+
+
+def decode_frame(data: bytes, offset: int = 0, into: Optional[KeyFrame] = None) -> KeyFrame:
+    """Decode one frame at offset, filling `into` when given"""
+    if len(data) - offset < FRAME_SIZE:
+        raise FrameError("Truncated key frame")
+    seq, key_id, flags, repeat = FRAME.unpack_from(data, offset)
+    if not 1 <= repeat <= 100:
+        raise FrameError(f"Repeat out of range: {repeat}")
+    if flags & FLAG_DOWN and flags & FLAG_UP:
+        raise FrameError("Frame sets both key-down and key-up")
+
+    if key_id < SPECIAL_KEY_BASE:
+        if 0xD800 <= key_id <= 0xDFFF:
+            raise FrameError(f"Invalid codepoint: {key_id:#x}")
+        key = chr(key_id)
+    else:
+        index = key_id - SPECIAL_KEY_BASE
+        if index >= len(SPECIAL_KEY_NAMES):
+            raise FrameError(f"Unknown key id: {key_id:#x}")
+        key = SPECIAL_KEY_NAMES[index]
+
+    frame = into if into is not None else KeyFrame()
+    frame.seq = seq
+    frame.repeat = repeat
+    frame.wait = bool(flags & FLAG_WAIT)
+    frame.event = 'down' if flags & FLAG_DOWN else 'up' if flags & FLAG_UP else 'press'
+    if flags & MOD_WIN:
+        # The win modifier only exists as a chord prefix in press_key
+        mods = [name for bit, name in ((MOD_CTRL, 'ctrl'), (MOD_SHIFT, 'shift'), (MOD_ALT, 'alt'))
+                if flags & bit]
+        frame.key = '+'.join(mods + ['win', key])
+        frame.ctrl = frame.shift = frame.alt = False
+    else:
+        frame.key = key
+        frame.ctrl = bool(flags & MOD_CTRL)
+        frame.shift = bool(flags & MOD_SHIFT)
+        frame.alt = bool(flags & MOD_ALT)
+    return frame
+
+
+def iter_frames(data: bytes, into: Optional[KeyFrame] = None) -> Iterator[KeyFrame]:
+    """Decode a buffer of back-to-back frames (one WebSocket message or datagram)"""
+    if not data or len(data) % FRAME_SIZE:
+        raise FrameError("Buffer is not a whole number of key frames")
+    for offset in range(0, len(data), FRAME_SIZE):
+        yield decode_frame(data, offset, into)
@@ -0,0 +1,94 @@
+"""
+Key Log - Asynchronous, rate-limited structured logging
+Records are queued on the calling thread and formatted/written by a background QueueListener,
+so no stdout or disk I/O happens on the keystroke hot path.
+"""
+
+import json
+import logging
+import queue
+import time
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, List, Optional
+
+
+class JsonLineFormatter(logging.Formatter):
+    """Compact one-object-per-line JSON; extra fields come from record.fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "event": record.getMessage(),
+        }
+        fields = getattr(record, 'fields', None)
+        if fields:
+            entry.update(fields)
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, separators=(',', ':'))
+
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler that never formats or blocks on the caller's thread
+
+    The stock prepare() formats the message before queueing; here the record is queued as-is and
+    the listener's handlers do all formatting. When the queue is full the record is dropped.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class ClientRateLimiter:
+    """Per-client token bucket deciding which key events get logged (rate <= 0 disables it)"""
+
+    MAX_CLIENTS = 256
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        # client -> [tokens, last refill (monotonic), events suppressed since last logged one]
+        self._buckets: Dict[str, List[float]] = {}
+
+    def check(self, client: str) -> Optional[int]:
+        """None if the event should be skipped, else how many were suppressed before it"""
+        if self.rate <= 0:
+            return 0
+        now = time.monotonic()
+        bucket = self._buckets.get(client)
+        if bucket is None:
+            if len(self._buckets) >= self.MAX_CLIENTS:
+                del self._buckets[next(iter(self._buckets))]
+            bucket = self._buckets[client] = [self.burst, now, 0]
+        tokens = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+        bucket[1] = now
+        if tokens < 1:
+            bucket[0] = tokens
+            bucket[2] += 1
+            return None
+        bucket[0] = tokens - 1
+        suppressed = int(bucket[2])
+        bucket[2] = 0
+        return suppressed
+
+
+def start_queue_logging(logger: logging.Logger, handlers: List[logging.Handler],
+                        level: int = logging.INFO, queue_size: int = 10000) -> QueueListener:
+    """Route a logger through a bounded queue to handlers run on a background thread"""
+    log_queue: queue.Queue = queue.Queue(queue_size)
+    logger.addHandler(DroppingQueueHandler(log_queue))
+    logger.setLevel(level)
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    return listener
@@ -0,0 +1,156 @@
+"""
+Key Repeat - Server-side autorepeat for held keys
+A client sends one 'down' and one 'up'; the repeats in between are generated here on a
+steady schedule instead of arriving as a stream of network requests.
+"""
+
+import threading
+import time
+import logging
+from concurrent.futures import Future
+from typing import Callable, Dict, Optional
+
+from injection import QueueFullError
+
+logger = logging.getLogger(__name__)
+
+
+class _Hold:
+    """A key held down by one client"""
+
+    __slots__ = ('key', 'ctrl', 'shift', 'alt', 'next_due', 'deadline', 'last')
+
+    def __init__(self, key: str, ctrl: bool, shift: bool, alt: bool, next_due: float,
+                 deadline: float, last: Future):
+        self.key = key
+        self.ctrl = ctrl
+        self.shift = shift
+        self.alt = alt
+        self.next_due = next_due
+        self.deadline = deadline
+        # Future of the most recent tap; a new repeat is only queued once it has run
+        self.last = last
+
+
+class RepeatScheduler:
+    """Turns down/up events into an initial tap plus timed repeats, one held key per client
+
+    Like a physical keyboard, a new 'down' from a client ends that client's previous hold (and the
+    server ends it when the client presses another key).
+    Repeats are queued through submit(key, ctrl, shift, alt, repeat, client) (the injection
+    worker's), on the holding client's queue, so they stay ordered with that client's other keys.
+    """
+
+    def __init__(self, submit: Callable[..., Future],
+                 delay: float = 0.5, rate: float = 20, timeout: float = 10):
+        self.submit = submit
+        self.delay = delay
+        self.rate = rate
+        # Holds with no 'up' (or refreshing 'down') for this long are released
+        self.timeout = timeout
+        self._holds: Dict[str, _Hold] = {}
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+        self.repeats = 0
+        # Repeats skipped because the previous one had not been injected yet or the queue was full
+        self.skipped = 0
+        self.expired = 0
+
+    @property
+    def active(self) -> int:
+        """Number of keys currently held"""
+        return len(self._holds)
+
+    def start(self):
+        """Start the scheduler thread (no-op if already running)"""
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+            self._thread = threading.Thread(target=self._run, name="keyote-repeat", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 2.0):
+        """Stop the scheduler thread and drop all holds"""
+        with self._cond:
+            if not self._running:
+                return
+            self._running = False
+            self._holds.clear()
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def hold(self, client: str, key: str, ctrl: bool = False, shift: bool = False,
+             alt: bool = False, submit: Optional[Callable[..., Future]] = None) -> Future:
+        """Press a key and start repeating it; the future resolves with the first tap
+
+        A 'down' for the key the client already holds only refreshes its safety timeout. The first
+        tap goes through `submit` when given (e.g. a batch's Reservation), otherwise self.submit.
+        """
+        now = time.monotonic()
+        with self._cond:
+            current = self._holds.get(client)
+            if current and (current.key, current.ctrl, current.shift, current.alt) == (key, ctrl, shift, alt):
+                current.deadline = now + self.timeout
+                return current.last
+            future = (submit or self.submit)(key, ctrl, shift, alt, 1, client)
+            self._holds[client] = _Hold(key, ctrl, shift, alt, now + self.delay,
+                                        now + self.timeout, future)
+            self._cond.notify()
+        return future
+
+    def release(self, client: str, key: Optional[str] = None) -> bool:
+        """End the client's hold (only if it is on `key`, when given); False if nothing was held"""
+        with self._cond:
+            current = self._holds.get(client)
+            if current is None or (key is not None and current.key != key):
+                return False
+            del self._holds[client]
+            return True
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._running:
+                    return
+                now = time.monotonic()
+                wake = self._tick(now)
+                self._cond.wait(None if wake is None else max(0.0, wake - now))
+
+    def _repeat(self, client: str, hold: _Hold) -> bool:
+        if not hold.last.done():
+            return False
+        try:
+            hold.last = self.submit(hold.key, hold.ctrl, hold.shift, hold.alt, 1, client)
+        except QueueFullError:
+            return False
+        return True
+
+    def _tick(self, now: float) -> Optional[float]:
+        """Queue due repeats and expire stale holds; returns the next wake-up time"""
+        interval = 1.0 / self.rate if self.rate > 0 else None
+        wake = None
+        for client, hold in list(self._holds.items()):
+            if now >= hold.deadline:
+                del self._holds[client]
+                self.expired += 1
+                logger.warning(f"Released '{hold.key}' held by {client}: no key-up within {self.timeout}s")
+                continue
+            if interval is None:
+                due = hold.deadline
+            else:
+                if now >= hold.next_due:
+                    if self._repeat(client, hold):
+                        self.repeats += 1
+                    else:
+                        self.skipped += 1
+                    hold.next_due += interval
+                    if hold.next_due <= now:
+                        # Fell behind (slow injection): resume the schedule from now
+                        hold.next_due = now + interval
+                due = min(hold.next_due, hold.deadline)
+            wake = due if wake is None else min(wake, due)
+        return wake
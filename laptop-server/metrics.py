@@ -0,0 +1,110 @@
+"""
+Metrics - Low-overhead latency histograms and Prometheus rendering for the key path
+Fixed-size log-scale buckets updated without locks; summaries are computed on read
+"""
+
+import bisect
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+
+# Bucket upper bounds in nanoseconds: 1 µs to ~67 s, four buckets per power of two
+BUCKET_BOUNDS: List[int] = [int(1000 * 2 ** (i / 4)) for i in range(105)]
+
+
+class LatencyHistogram:
+    """Fixed-size latency histogram
+
+    record() does a bisect and a few integer updates with no lock. Concurrent writers
+    may very rarely lose an increment, which is acceptable for monitoring data.
+    """
+
+    __slots__ = ('counts', 'count', 'total_ns', 'max_ns')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKET_BOUNDS) + 1)
+        self.count = 0
+        self.total_ns = 0
+        self.max_ns = 0
+
+    def record(self, ns: int):
+        self.counts[bisect.bisect_left(BUCKET_BOUNDS, ns)] += 1
+        self.count += 1
+        self.total_ns += ns
+        if ns > self.max_ns:
+            self.max_ns = ns
+
+    def percentile(self, q: float) -> int:
+        """Upper bound (ns) of the bucket holding the q-th percentile"""
+        counts = list(self.counts)
+        total = sum(counts)
+        if not total:
+            return 0
+        rank = q / 100 * total
+        seen = 0
+        for i, n in enumerate(counts):
+            seen += n
+            if seen >= rank:
+                return min(BUCKET_BOUNDS[i], self.max_ns) if i < len(BUCKET_BOUNDS) else self.max_ns
+        return self.max_ns
+
+    def summary(self) -> Dict[str, Any]:
+        """p50/p95/p99/max in milliseconds"""
+        return {
+            "count": self.count,
+            "p50": round(self.percentile(50) / 1e6, 3),
+            "p95": round(self.percentile(95) / 1e6, 3),
+            "p99": round(self.percentile(99) / 1e6, 3),
+            "max": round(self.max_ns / 1e6, 3),
+        }
+
+
+class StageLatency:
+    """One histogram per named stage; the stage set is fixed at construction"""
+
+    def __init__(self, stages: Iterable[str]):
+        self.histograms: Dict[str, LatencyHistogram] = {stage: LatencyHistogram() for stage in stages}
+
+    def record(self, stage: str, ns: int):
+        self.histograms[stage].record(ns)
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        return {stage: h.summary() for stage, h in self.histograms.items()}
+
+
+# Prometheus exposition: every power-of-two bucket bound, in seconds
+PROMETHEUS_BUCKETS = range(0, len(BUCKET_BOUNDS), 4)
+
+
+def _labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    inner = ",".join(f'{k}="{v}"' for k, v in labels.items())
+    return "{" + inner + "}"
+
+
+def prometheus_family(name: str, kind: str, help_text: str,
+                      samples: Iterable[Tuple[Dict[str, str], float]]) -> str:
+    """Render one counter or gauge family in Prometheus text format"""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+    lines.extend(f"{name}{_labels(labels)} {value}" for labels, value in samples)
+    return "\n".join(lines) + "\n"
+
+
+def prometheus_histograms(name: str, help_text: str, stages: StageLatency,
+                          label: str = "stage") -> Iterator[str]:
+    """Render a StageLatency as one histogram family, yielding one stage at a time"""
+    yield f"# HELP {name} {help_text}\n# TYPE {name} histogram\n"
+    for stage, histogram in stages.histograms.items():
+        counts = list(histogram.counts)
+        total_ns = histogram.total_ns
+        lines = []
+        cumulative = 0
+        previous = 0
+        for i in PROMETHEUS_BUCKETS:
+            cumulative += sum(counts[previous:i + 1])
+            previous = i + 1
+            lines.append(f'{name}_bucket{{{label}="{stage}",le="{BUCKET_BOUNDS[i] / 1e9:.9g}"}} {cumulative}')
+        count = sum(counts)
+        lines.append(f'{name}_bucket{{{label}="{stage}",le="+Inf"}} {count}')
+        lines.append(f'{name}_sum{{{label}="{stage}"}} {total_ns / 1e9:.9g}')
+        lines.append(f'{name}_count{{{label}="{stage}"}} {count}')
+        yield "\n".join(lines) + "\n"
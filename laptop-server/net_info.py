@@ -0,0 +1,197 @@
+"""
+Network Info - Cached local interface addresses
+Every local IPv4/IPv6 address is listed with its interface and a guess at what kind of link it is
+(USB tether, Wi-Fi, Ethernet). A background thread refreshes the list on a timer, so readers such as
+/info and the dashboard get the cached result without touching the network stack.
+"""
+
+import ipaddress
+import logging
+import re
+import socket
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+REFRESH_INTERVAL = 30.0
+
+# Interface kinds, best candidate for the phone to reach first
+KIND_ORDER = ('usb', 'wifi', 'ethernet', 'other', 'loopback')
+
+# Interface names: Linux usb0/rndis0/enx<mac>, Windows "Remote NDIS" adapters, macOS iPhone USB
+USB_NAMES = re.compile(r'usb|rndis|^enx|ncm|tether|iphone|android', re.IGNORECASE)
+WIFI_NAMES = re.compile(r'^wl|wi-?fi|wireless|airport', re.IGNORECASE)
+# macOS en0/en1 may be either Wi-Fi or Ethernet, so they are left as 'other'
+ETHERNET_NAMES = re.compile(r'^eth|^en[ops]|ethernet|^lan', re.IGNORECASE)
+# Subnets phones hand out when tethering over USB (Android, iPhone)
+USB_SUBNETS = tuple(ipaddress.ip_network(n) for n in ('192.168.42.0/24', '172.20.10.0/28'))
+
+
+class InterfaceAddress:
+    """One address on one local interface"""
+
+    __slots__ = ('name', 'address', 'family', 'kind', 'link_local')
+
+    def __init__(self, name: str, address: str, family: int, kind: str):
+        self.name = name
+        self.address = address
+        self.family = family
+        self.kind = kind
+        # IPv6 fe80:: addresses need a zone id, so phones cannot use them as a URL
+        self.link_local = family == 6 and ipaddress.ip_address(address).is_link_local
+
+    def rank(self) -> Tuple[int, int, bool]:
+        """Sort key: preferred kind, then IPv4 before IPv6, then routable before link-local"""
+        return (KIND_ORDER.index(self.kind), self.family, self.link_local)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"interface": self.name, "address": self.address, "family": f"ipv{self.family}",
+                "kind": self.kind}
+
+
+def classify(name: str, address: str) -> str:
+    """Guess the link type of an interface from its name, then from well-known tether subnets"""
+    ip = ipaddress.ip_address(address)
+    if ip.is_loopback:
+        return 'loopback'
+    if USB_NAMES.search(name):
+        return 'usb'
+    if WIFI_NAMES.search(name):
+        return 'wifi'
+    if any(ip in subnet for subnet in USB_SUBNETS if subnet.version == ip.version):
+        return 'usb'
+    if ETHERNET_NAMES.search(name):
+        return 'ethernet'
+    return 'other'
+
+
+def _load_psutil():
+    """psutil, imported on first discovery (on the refresh thread); None if not installed"""
+    try:
+        import psutil
+        return psutil
+    except ImportError:  # optional dependency: fall back to hostname lookup
+        return None
+
+
+def _psutil_addresses(psutil) -> List[Tuple[str, str, int]]:
+    stats = psutil.net_if_stats()
+    found = []
+    for name, addrs in psutil.net_if_addrs().items():
+        if name in stats and not stats[name].isup:
+            continue
+        for addr in addrs:
+            if addr.family == socket.AF_INET:
+                found.append((name, addr.address, 4))
+            elif addr.family == socket.AF_INET6:
+                found.append((name, addr.address.split('%', 1)[0], 6))
+    return found
+
+
+def _socket_addresses() -> List[Tuple[str, str, int]]:
+    """Without psutil: whatever the hostname resolves to, plus the default-route address if online"""
+    found = set()
+    try:
+        for family, _, _, _, sockaddr in socket.getaddrinfo(socket.gethostname(), None):
+            if family in (socket.AF_INET, socket.AF_INET6):
+                found.add(('', sockaddr[0].split('%', 1)[0], 4 if family == socket.AF_INET else 6))
+    except OSError:
+        pass
+    try:
+        # connect() on UDP only selects a route; nothing is sent
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+            s.connect(("8.8.8.8", 80))
+            found.add(('', s.getsockname()[0], 4))
+    except OSError:
+        pass
+    return sorted(found)
+
+
+def discover() -> List[InterfaceAddress]:
+    """Read every local address now, best candidate first"""
+    try:
+        psutil = _load_psutil()
+        raw = _psutil_addresses(psutil) if psutil else _socket_addresses()
+    except Exception as e:
+        logger.warning(f"Interface discovery failed: {e}")
+        raw = []
+    addresses = [InterfaceAddress(name, address, family, classify(name, address))
+                 for name, address, family in raw]
+    addresses.sort(key=InterfaceAddress.rank)
+    return addresses
+
+
+class NetworkInfo:
+    """Interface address cache shared by the server and the dashboard
+
+    Readers only see fully built immutable results; `version` increases whenever the addresses change.
+    """
+
+    def __init__(self, interval: float = REFRESH_INTERVAL):
+        self.interval = interval
+        self.version = 0
+        self.addresses: Tuple[InterfaceAddress, ...] = ()
+        self.primary = "127.0.0.1"
+        self.info: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._loaded = False
+
+    def ensure_loaded(self):
+        """Discover once if nothing has been read yet"""
+        if not self._loaded:
+            self.refresh()
+
+    def refresh(self) -> bool:
+        """Re-read the addresses now; True if they changed"""
+        addresses = tuple(discover())
+        info = [a.as_dict() for a in addresses]
+        with self._lock:
+            self._loaded = True
+            if info == self.info:
+                return False
+            usable = [a for a in addresses if a.kind != 'loopback']
+            self.addresses = addresses
+            self.primary = usable[0].address if usable else "127.0.0.1"
+            self.info = info
+            self.version += 1
+        logger.info(f"Network addresses: {', '.join(f'{a.name or a.kind}={a.address}' for a in addresses) or 'none'}")
+        return True
+
+    def request_refresh(self):
+        """Ask the background thread to re-read the addresses soon"""
+        self._wake.set()
+
+    def urls(self, port: int) -> List[str]:
+        """Server URLs for every address a phone can reach, best first"""
+        return [f"http://[{a.address}]:{port}" if a.family == 6 else f"http://{a.address}:{port}"
+                for a in self.addresses if a.kind != 'loopback' and not a.link_local]
+
+    def start(self):
+        """Start the refresh thread (no-op if already running)"""
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="keyote-netinfo", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 2.0):
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.refresh()
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+
+# Shared by the server and the dashboard, which run in one process
+network = NetworkInfo()
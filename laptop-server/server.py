@@ -4,23 +4,48 @@ Receives keyboard commands from mobile app via USB tethering and simulates keybo
 Thread-safe implementation for GUI integration.
 """
 
+import asyncio
 import json
-import socket
+import re
+import string
 import sys
 import threading
+import time
 import logging
 import traceback
+import uuid
+import queue
+from collections import OrderedDict, deque
+from concurrent.futures import Future
 from pathlib import Path
-from typing import Dict, Any, Optional, Callable
-from datetime import datetime
+from typing import Callable, Dict, Any, Generator, List, Literal, Optional, Deque, Sequence, Set, Tuple
 from contextlib import asynccontextmanager
+from functools import lru_cache
+from logging.handlers import QueueListener, RotatingFileHandler
 
-from fastapi import FastAPI, HTTPException, Request
+from fastapi import Body, FastAPI, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from pydantic import BaseModel, Field, field_validator
-from pynput.keyboard import Controller, Key
-import uvicorn
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, Field, ValidationError, field_validator
+from pynput.keyboard import Key
+
+from backends import InjectionBackend, RecordingBackend, create_backend
+from clipboard import Clipboard, MemoryClipboard, create_clipboard
+from injection import REPEAT_INTERVAL, InjectionWorker, QueueFullError, RequestTooLargeError
+from config_store import get_store
+from fast_path import KeyFastPath, encode_json, encode_key_response, parse_key_request
+from ip_filter import AllowedIPsMiddleware, IPAllowList
+from net_info import network
+from startup_profile import profile
+from key_log import ClientRateLimiter, DroppingQueueHandler, JsonLineFormatter
+from key_repeat import RepeatScheduler
+from sessions import SessionTable
+from metrics import StageLatency, prometheus_family, prometheus_histograms
+from key_frames import CONTENT_TYPE as KEY_FRAME_CONTENT_TYPE, FRAME_SIZE, FrameError, KeyFrame, decode_frame, iter_frames
+from udp_listener import open_udp_listener
+
+KEY_FRAME_CONTENT_TYPE_BYTES = KEY_FRAME_CONTENT_TYPE.encode()
 
 logger = logging.getLogger(__name__)
 
@@ -42,25 +67,36 @@ except PermissionError:
     APPDATA_DIR.mkdir(exist_ok=True)
     CONFIG_FILE = APPDATA_DIR / "config.json"
 
-keyboard = Controller()
+# Shared with the dashboard: atomic writes and change notifications for config.json
+config_store = get_store(CONFIG_FILE)
 
-# Global callback for logging to GUI
-_log_callback: Optional[Callable[[str], None]] = None
+# Log events for the GUI: (unix time, kind, message). deque.append/popleft are atomic, so the
+# server threads push and the dashboard drains on its own timer without a lock; when the GUI
+# falls behind the oldest events are dropped.
+LOG_BUFFER_SIZE = 2048
+log_events: Deque[Tuple[float, str, str]] = deque(maxlen=LOG_BUFFER_SIZE)
+log_events_dropped = 0
 
 
-def set_log_callback(callback: Callable[[str], None]):
-    """Set callback function for logging to GUI"""
-    global _log_callback
-    _log_callback = callback
+def gui_log(message: str, kind: str = "info"):
+    """Queue a log message for the GUI ("key" events may be coalesced by the dashboard)"""
+    global log_events_dropped
+    started_ns = time.perf_counter_ns()
+    if len(log_events) == LOG_BUFFER_SIZE:
+        log_events_dropped += 1
+    log_events.append((time.time(), kind, message))
+    latency.record("gui", time.perf_counter_ns() - started_ns)
 
 
-def gui_log(message: str):
-    """Send log message to GUI if callback is set"""
-    if _log_callback:
-        try:
-            _log_callback(message)
-        except Exception:
-            pass
+def drain_log_events(limit: int = LOG_BUFFER_SIZE) -> List[Tuple[float, str, str]]:
+    """Pop up to `limit` queued log events, oldest first"""
+    events = []
+    try:
+        for _ in range(limit):
+            events.append(log_events.popleft())
+    except IndexError:
+        pass
+    return events
 
 
 class KeyCommand(BaseModel):
@@ -69,6 +105,11 @@ class KeyCommand(BaseModel):
     shift: bool = False
     alt: bool = False
     repeat: int = Field(default=1, ge=1, le=100)
+    # 'down' holds the key (server-side autorepeat) until the matching 'up'
+    event: Literal['press', 'down', 'up'] = 'press'
+    wait: bool = False
+    # Client send time (Unix epoch milliseconds), used for the "network" latency stage
+    sent_at: Optional[float] = None
 
     @field_validator('key')
     @classmethod
@@ -78,43 +119,209 @@ class KeyCommand(BaseModel):
         return v
 
 
+# Slowest /type pacing accepted, from the request or type_chars_per_second (characters per second)
+MIN_CHARS_PER_SECOND = 1
+
+
+class TypeRequest(BaseModel):
+    text: str = Field(..., min_length=1)
+    chars_per_second: Optional[float] = Field(default=None, ge=MIN_CHARS_PER_SECOND)
+    # "auto" pastes text of type_paste_threshold characters or more, "type" and "paste" force a mode
+    mode: Literal['auto', 'type', 'paste'] = 'auto'
+    wait: bool = False
+
+
 class Config:
     def __init__(self):
         self.port: int = 5000
         self.host: str = "0.0.0.0"
         self.log_level: str = "INFO"
         self.allowed_ips: list = []
+        self.max_payload_size: int = 16384
+        self.max_batch_size: int = 256
+        self.udp_port: int = 0
+        self.max_type_bytes: int = 65536
+        self.type_chars_per_second: float = 0
+        self.type_chunk_size: int = 64
+        self.injection_backend: str = "pynput"
+        self.key_log_rate: float = 20
+        self.key_log_burst: int = 50
+        self.key_log_max_bytes: int = 1048576
+        self.key_log_backups: int = 3
+        self.key_log_console: bool = True
+        self.key_repeat_delay: float = 0.5
+        self.key_repeat_rate: float = 20
+        self.key_hold_timeout: float = 10
+        self.stale_navigation_ms: float = 0
+        self.max_pending_keys: int = 512
+        self.max_pending_per_client: int = 256
+        self.macros: Dict[str, List[Any]] = {}
+        self.type_paste_threshold: int = 512
+        self.paste_chord: str = ""
+        self.paste_restore_clipboard: bool = True
         self.load()
 
     def load(self):
-        if CONFIG_FILE.exists():
-            try:
-                with open(CONFIG_FILE, 'r') as f:
-                    data = json.load(f)
-                self.port = data.get('port', 5000)
-                self.host = data.get('host', '0.0.0.0')
-                self.log_level = data.get('log_level', 'INFO')
-                self.allowed_ips = data.get('allowed_ips', [])
-            except Exception as e:
-                print(f"Error loading config: {e}, using defaults")
-        else:
+        """Read config.json (through the shared store), creating it with defaults if missing"""
+        if not CONFIG_FILE.exists():
             self.save()
+            return
+        config_store.check()
+        self.apply(config_store.read())
+
+    def apply(self, data: Dict[str, Any]):
+        try:
+            self.port = data.get('port', 5000)
+            self.host = data.get('host', '0.0.0.0')
+            self.log_level = data.get('log_level', 'INFO')
+            self.allowed_ips = data.get('allowed_ips', [])
+            self.max_payload_size = data.get('max_payload_size', 16384)
+            self.max_batch_size = data.get('max_batch_size', 256)
+            self.udp_port = data.get('udp_port', 0)
+            self.max_type_bytes = data.get('max_type_bytes', 65536)
+            self.type_chars_per_second = data.get('type_chars_per_second', 0)
+            self.type_chunk_size = data.get('type_chunk_size', 64)
+            self.injection_backend = data.get('injection_backend', 'pynput')
+            self.key_log_rate = data.get('key_log_rate', 20)
+            self.key_log_burst = data.get('key_log_burst', 50)
+            self.key_log_max_bytes = data.get('key_log_max_bytes', 1048576)
+            self.key_log_backups = data.get('key_log_backups', 3)
+            self.key_log_console = data.get('key_log_console', True)
+            self.key_repeat_delay = data.get('key_repeat_delay', 0.5)
+            self.key_repeat_rate = data.get('key_repeat_rate', 20)
+            self.key_hold_timeout = data.get('key_hold_timeout', 10)
+            self.stale_navigation_ms = data.get('stale_navigation_ms', 0)
+            self.max_pending_keys = data.get('max_pending_keys', 512)
+            self.max_pending_per_client = data.get('max_pending_per_client', 256)
+            self.macros = data.get('macros', {})
+            self.type_paste_threshold = data.get('type_paste_threshold', 512)
+            self.paste_chord = data.get('paste_chord', '')
+            self.paste_restore_clipboard = data.get('paste_restore_clipboard', True)
+        except Exception as e:
+            print(f"Error loading config: {e}, using defaults")
 
     def save(self):
+        """Write the server's settings, keeping keys owned by the dashboard (theme, auto_start, ...)"""
         try:
-            with open(CONFIG_FILE, 'w') as f:
-                json.dump({
-                    'port': self.port,
-                    'host': self.host,
-                    'log_level': self.log_level,
-                    'allowed_ips': self.allowed_ips
-                }, f, indent=2)
+            config_store.update({
+                'port': self.port,
+                'host': self.host,
+                'log_level': self.log_level,
+                'allowed_ips': self.allowed_ips,
+                'max_payload_size': self.max_payload_size,
+                'max_batch_size': self.max_batch_size,
+                'udp_port': self.udp_port,
+                'max_type_bytes': self.max_type_bytes,
+                'type_chars_per_second': self.type_chars_per_second,
+                'type_chunk_size': self.type_chunk_size,
+                'injection_backend': self.injection_backend,
+                'key_log_rate': self.key_log_rate,
+                'key_log_burst': self.key_log_burst,
+                'key_log_max_bytes': self.key_log_max_bytes,
+                'key_log_backups': self.key_log_backups,
+                'key_log_console': self.key_log_console,
+                'key_repeat_delay': self.key_repeat_delay,
+                'key_repeat_rate': self.key_repeat_rate,
+                'key_hold_timeout': self.key_hold_timeout,
+                'stale_navigation_ms': self.stale_navigation_ms,
+                'max_pending_keys': self.max_pending_keys,
+                'max_pending_per_client': self.max_pending_per_client,
+                'macros': self.macros,
+                'type_paste_threshold': self.type_paste_threshold,
+                'paste_chord': self.paste_chord,
+                'paste_restore_clipboard': self.paste_restore_clipboard
+            })
         except Exception as e:
             print(f"Error saving config: {e}")
 
 
 config = Config()
 
+# Key-path audit log: records are queued here and written as JSON lines by a background
+# listener (started with the server), so keystrokes never wait on stdout or disk
+KEY_LOG_FILE = CONFIG_FILE.parent / "keyote_keys.log"
+key_logger = logging.getLogger("keyote.keys")
+key_logger.propagate = False
+key_logger.setLevel(logging.INFO)
+_key_log_handler = DroppingQueueHandler(queue.Queue(10000))
+key_logger.addHandler(_key_log_handler)
+key_log_limiter = ClientRateLimiter(config.key_log_rate, config.key_log_burst)
+_key_log_listener: Optional[QueueListener] = None
+
+
+def start_key_log():
+    """Start the background writer for the key log (rotating file plus optional console)"""
+    global _key_log_listener
+    if _key_log_listener:
+        return
+    formatter = JsonLineFormatter()
+    handlers: List[logging.Handler] = []
+    try:
+        file_handler = RotatingFileHandler(
+            KEY_LOG_FILE,
+            maxBytes=config.key_log_max_bytes,
+            backupCount=config.key_log_backups,
+            encoding='utf-8'
+        )
+        file_handler.setFormatter(formatter)
+        handlers.append(file_handler)
+    except OSError as e:
+        print(f"Key log file unavailable ({e}), logging to console only")
+    if config.key_log_console and sys.stdout:
+        console_handler = logging.StreamHandler(sys.stdout)
+        console_handler.setFormatter(formatter)
+        handlers.append(console_handler)
+    _key_log_listener = QueueListener(_key_log_handler.queue, *handlers)
+    _key_log_listener.start()
+
+
+def stop_key_log():
+    """Flush queued key log records and stop the writer thread"""
+    global _key_log_listener
+    if _key_log_listener:
+        _key_log_listener.stop()
+        for handler in _key_log_listener.handlers:
+            handler.close()
+        _key_log_listener = None
+
+
+# Injection backend that press_key and type_text drive (pynput, recording or uinput)
+keyboard = create_backend(config.injection_backend)
+
+
+class ServerStats:
+    """Running transport counters, only updated from the event loop thread"""
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.http_keys = 0
+        self.ws_frames = 0
+        self.udp_datagrams = 0
+        self.udp_malformed = 0
+        self.udp_duplicates = 0
+        self.udp_lost = 0
+        self.ws_clients = 0
+        self.requests: Dict[str, int] = {}
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "uptime": round(time.time() - self.started_at, 1),
+            "http_keys": self.http_keys,
+            "ws_frames": self.ws_frames,
+            "udp_datagrams": self.udp_datagrams,
+            "udp_malformed": self.udp_malformed,
+            "udp_duplicates": self.udp_duplicates,
+            "udp_lost": self.udp_lost,
+            "ws_clients": self.ws_clients,
+        }
+
+
+stats = ServerStats()
+
+# Key path stages, in the order a /key request passes through them
+LATENCY_STAGES = ("network", "http", "parse", "log", "gui", "enqueue", "queue", "inject", "total")
+latency = StageLatency(LATENCY_STAGES)
+
 
 SPECIAL_KEYS = {
     'enter': Key.enter,
@@ -155,46 +362,184 @@ MODIFIER_KEYS = {
 }
 
 
+def stop_injection():
+    """Stop the key repeater, the injector and the key log; a no-op for those already stopped"""
+    repeater.stop()
+    injector.stop()
+    stop_key_log()
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     print(f"Server starting on http://{config.host}:{config.port}")
     print(f"Laptop IP: {get_local_ip()}")
+    # Shared with the dashboard, so they are left running on shutdown
+    network.start()
+    config_store.start()
+    start_key_log()
+    warm_up()
+    injector.start()
+    repeater.start()
+    profile.mark("server ready")
+    if profile.enabled:
+        print(startup_report())
     print("Waiting for connections...")
     yield
     print("\nServer shutting down...")
+    stop_injection()
+    if profile.enabled:
+        print(startup_report())
 
 
 app = FastAPI(title="Keyote Server", version=VERSION, lifespan=lifespan)
 
+# Sent on every HTTP response: key presses waiting for injection, so clients can pace themselves
+QUEUE_DEPTH_HEADER = "X-Keyote-Queue-Depth"
+QUEUE_DEPTH_HEADER_BYTES = QUEUE_DEPTH_HEADER.lower().encode()
+# Optional stable id sent by clients, telling apart several devices (or apps) behind one IP
+CLIENT_ID_HEADER = "X-Keyote-Client"
+
+sessions = SessionTable()
+allow_list = IPAllowList(config.allowed_ips)
+
+
+# Settings that only take effect when the server (re)starts; port/host/udp_port are rebound live by
+# ServerManager when the server runs under the dashboard
+RESTART_SETTINGS = frozenset({'injection_backend', 'key_log_max_bytes', 'key_log_backups', 'key_log_console'})
+LISTEN_SETTINGS = frozenset({'port', 'host', 'udp_port'})
+
+
+def apply_runtime_settings():
+    """Push the live-tunable settings from config into the running components"""
+    allow_list.update(config.allowed_ips)
+    level = getattr(logging, str(config.log_level).upper(), logging.INFO)
+    for name in ("uvicorn", "uvicorn.error", __name__):
+        logging.getLogger(name).setLevel(level)
+    key_logger.setLevel(level)
+    key_log_limiter.rate = config.key_log_rate
+    key_log_limiter.burst = config.key_log_burst
+    repeater.delay = config.key_repeat_delay
+    repeater.rate = config.key_repeat_rate
+    repeater.timeout = config.key_hold_timeout
+    injector.stale_after_ns = int(config.stale_navigation_ms * 1e6)
+    injector.max_pending = config.max_pending_keys
+    injector.max_pending_per_client = config.max_pending_per_client
+    global macros
+    macros = compile_macros(config.macros)
+
+
+def reload_config():
+    """Re-read config.json and re-apply the settings that take effect without a restart"""
+    config.load()
+    apply_runtime_settings()
+
+
+def _swap_backend(backend: InjectionBackend) -> str:
+    """Make `backend` the injection backend; runs on the injector thread, between two keys"""
+    global keyboard
+    old, keyboard = keyboard, backend
+    try:
+        old.close()
+    except Exception as e:
+        print(f"Closing injection backend '{old.name}' failed: {e}")
+    return backend.name
+
+
+def restart_in_place() -> Optional[Future]:
+    """Re-read config.json and apply every setting, including the ones that need a restart
+
+    Queued keys, held keys and client sessions are kept. Returns a future that resolves once a
+    changed injection backend has taken over, or None if the backend is unchanged.
+    """
+    reload_config()
+    stop_key_log()
+    start_key_log()
+    if config.injection_backend == keyboard.name:
+        return None
+    backend = create_backend(config.injection_backend)
+    try:
+        backend.warm_up()
+    except Exception as e:
+        print(f"Injection backend warm-up failed: {e}")
+    # Swapped on the injector thread so no key is ever sent half through one backend
+    return injector.run_next(lambda: _swap_backend(backend), "swap backend")
+
+
+def on_config_changed(data: Dict[str, Any], changed: Set[str]):
+    """Config store listener: a saved setting reaches the running server within milliseconds"""
+    config.apply(data)
+    apply_runtime_settings()
+    gui_log(f"Config applied: {', '.join(sorted(changed))}")
+    pending_restart = changed & RESTART_SETTINGS
+    if pending_restart:
+        gui_log(f"Restart the server to apply: {', '.join(sorted(pending_restart))}")
+
+
+config_store.add_listener(on_config_changed)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[QUEUE_DEPTH_HEADER, "Retry-After"],
 )
 
 
 @app.middleware("http")
 async def payload_size_limit(request: Request, call_next):
+    received_ns = time.perf_counter_ns()
+    request.state.received_ns = received_ns
     content_length = request.headers.get('content-length')
-    if content_length and int(content_length) > 1024:
+    if request.url.path == '/type':
+        # Coarse guard on the raw JSON: handle_type checks the exact UTF-8 size after parsing
+        limit = config.max_type_bytes * JSON_ESCAPE_FACTOR + 1024
+    else:
+        limit = config.max_payload_size
+    if content_length and int(content_length) > limit:
         return JSONResponse(
             status_code=413,
-            content={"error": "Payload too large"}
+            content={"error": "Payload too large"},
+            headers={QUEUE_DEPTH_HEADER: str(injector.pending)}
         )
-    return await call_next(request)
+    path = _endpoint_label(request.url.path)
+    stats.requests[path] = stats.requests.get(path, 0) + 1
+    response = await call_next(request)
+    if request.url.path == '/key':
+        latency.record("total", time.perf_counter_ns() - received_ns)
+    response.headers[QUEUE_DEPTH_HEADER] = str(injector.pending)
+    return response
+
+
+# Well-formed POST /key requests skip FastAPI entirely (see fast_path.py); everything else falls through
+app.add_middleware(
+    KeyFastPath,
+    handle=lambda body, headers, client_ip: fast_key(body, headers, client_ip),
+    max_body=lambda: config.max_payload_size,
+    common_headers=lambda: [(QUEUE_DEPTH_HEADER_BYTES, str(injector.pending).encode())],
+)
+# Added last so it wraps everything else: blocked clients get a 403 before any body is read
+app.add_middleware(
+    AllowedIPsMiddleware,
+    allow_list=allow_list,
+    common_headers=lambda: [(QUEUE_DEPTH_HEADER_BYTES, str(injector.pending).encode())],
+)
+
+
+def _endpoint_label(path: str) -> str:
+    """Collapse request paths onto route templates so metric labels stay bounded"""
+    if path.startswith('/type/'):
+        return '/type/{job_id}'
+    if path in ('/health', '/info', '/stats', '/stats/latency', '/sessions', '/metrics', '/key', '/keys', '/type'):
+        return path
+    return 'other'
 
 
 def get_local_ip() -> str:
-    try:
-        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        s.connect(("8.8.8.8", 80))
-        ip = s.getsockname()[0]
-        s.close()
-        return ip
-    except Exception:
-        return "127.0.0.1"
+    """Best address for the phone to connect to, from the interface cache"""
+    network.ensure_loaded()
+    return network.primary
 
 
 def get_os_name() -> str:
@@ -207,8 +552,20 @@ def get_os_name() -> str:
     return sys.platform
 
 
-def log_request(client_ip: str, key: str, ctrl: bool, shift: bool, alt: bool):
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+def log_request(client_ip: str, key: str, ctrl: bool, shift: bool, alt: bool, event: str = 'press'):
+    if event == 'up':
+        return
+    started_ns = time.perf_counter_ns()
+    suppressed = key_log_limiter.check(client_ip)
+    if suppressed is not None:
+        fields = {"client": client_ip, "key": key, "ctrl": ctrl, "shift": shift, "alt": alt}
+        if event != 'press':
+            fields["action"] = event
+        if suppressed:
+            fields["suppressed"] = suppressed
+        key_logger.info("key", extra={"fields": fields})
+    latency.record("log", time.perf_counter_ns() - started_ns)
+
     modifiers = []
     if ctrl:
         modifiers.append("Ctrl")
@@ -220,80 +577,528 @@ def log_request(client_ip: str, key: str, ctrl: bool, shift: bool, alt: bool):
     mod_str = "+".join(modifiers) if modifiers else ""
     key_display = f"{mod_str}+{key}" if mod_str else key
     
-    log_msg = f"Mobile → Key '{key_display}'"
-    print(f"[{timestamp}] {client_ip} → Key: '{key}', Ctrl: {ctrl}, Shift: {shift}, Alt: {alt}")
-    gui_log(log_msg)
+    held = " (held)" if event == 'down' else ""
+    gui_log(f"Mobile → Key '{key_display}'{held}", kind="key")
 
 
-def press_key(key_name: str, ctrl: bool = False, shift: bool = False, alt: bool = False) -> bool:
+def record_network_latency(sent_at: Optional[float]):
+    """Record client-to-server delay from a client send timestamp (epoch ms); skewed clocks are ignored"""
+    if sent_at is None:
+        return
+    delay_ms = time.time() * 1000 - sent_at
+    if 0 <= delay_ms < 60000:
+        latency.record("network", int(delay_ms * 1e6))
+
+
+# Compiled key actions are flat tuples of (op, key) operations
+PRESS = 0
+RELEASE = 1
+SETTLE = 2
+# Macro step delay; its operand is the pause in seconds
+PAUSE = 3
+
+# Delay that lets modifiers register around a chord (seconds)
+MODIFIER_SETTLE = 0.01
+
+KeyAction = Tuple[Tuple[int, Any], ...]
+# (modifiers, key, settle): the parts of a command that press_run can share across commands
+KeyChord = Tuple[Tuple[Any, ...], Any, bool]
+
+# Limits on a macro, which holds the injector for its whole run
+MAX_MACRO_STEPS = 256
+MAX_MACRO_DELAY = 10.0
+
+# Keys whose queued presses the opt-in stale_navigation_ms policy may drop
+NAVIGATION_KEYS = frozenset({
+    'up', 'down', 'left', 'right', 'home', 'end', 'pageup', 'pagedown', 'page_up', 'page_down',
+})
+
+
+def _resolve_key(name: str) -> Any:
+    if name in SPECIAL_KEYS:
+        return SPECIAL_KEYS[name]
+    if len(name) == 1:
+        return name
+    raise ValueError(f"Unknown key '{name}'")
+
+
+@lru_cache(maxsize=1024)
+def resolve_chord(key_name: str, ctrl: bool = False, shift: bool = False, alt: bool = False) -> KeyChord:
+    """Split a key command into its modifiers, key and whether it needs settle delays (cached, raises ValueError)"""
+    # Composite shortcut (e.g. "win+tab", "alt+tab"); a lone "+" is just the plus key
+    if '+' in key_name and len(key_name) > 1:
+        parts = key_name.lower().split('+')
+        modifiers = []
+        for part in parts[:-1]:
+            part = part.strip()
+            if part not in MODIFIER_KEYS:
+                raise ValueError(f"Unknown modifier '{part}' in '{key_name}'")
+            modifiers.append(MODIFIER_KEYS[part])
+        return tuple(modifiers), _resolve_key(parts[-1].strip()), True
+
+    modifiers = []
+    if ctrl:
+        modifiers.append(Key.ctrl)
+    if shift:
+        modifiers.append(Key.shift)
+    if alt:
+        modifiers.append(Key.alt)
+
+    lowered = key_name.lower()
+    key_obj = SPECIAL_KEYS[lowered] if lowered in SPECIAL_KEYS else _resolve_key(key_name)
+    return tuple(modifiers), key_obj, False
+
+
+def check_chord(key_name: str, ctrl: bool = False, shift: bool = False, alt: bool = False):
+    """Raise ValueError unless the command is valid and the current backend can inject all of its keys"""
+    modifiers, key_obj, _ = resolve_chord(key_name, ctrl, shift, alt)
+    for key in modifiers + (key_obj,):
+        keyboard.check(key)
+
+
+@lru_cache(maxsize=1024)
+def resolve_action(key_name: str, ctrl: bool = False, shift: bool = False, alt: bool = False) -> KeyAction:
+    """Compile a key command into press/release operations (cached, raises ValueError if invalid)"""
+    modifiers, key_obj, settle = resolve_chord(key_name, ctrl, shift, alt)
+    pause = ((SETTLE, None),) if settle else ()
+    return (
+        tuple((PRESS, mod) for mod in modifiers)
+        + pause + ((PRESS, key_obj), (RELEASE, key_obj)) + pause
+        + tuple((RELEASE, mod) for mod in reversed(modifiers))
+    )
+
+
+def run_action(action: KeyAction):
+    """Replay a compiled key action on the injection backend
+
+    If an operation fails, the keys it left pressed are released before the error is re-raised,
+    so no modifier stays stuck on the host.
+    """
+    index = 0
     try:
-        # Check if key is a composite shortcut (e.g., "win+tab", "alt+tab")
-        if '+' in key_name:
-            parts = key_name.lower().split('+')
-            modifiers = []
-            actual_key = parts[-1]
-            
-            # Process all parts except the last one as modifiers
-            for part in parts[:-1]:
-                part = part.strip()
-                if part in MODIFIER_KEYS:
-                    modifiers.append(MODIFIER_KEYS[part])
-            
-            # Press all modifiers
-            for mod in modifiers:
-                keyboard.press(mod)
-            
-            # Small delay to ensure modifiers register
-            import time
-            time.sleep(0.01)
-            
-            # Press and release the actual key
-            if actual_key in SPECIAL_KEYS:
-                key_obj = SPECIAL_KEYS[actual_key]
-                keyboard.press(key_obj)
-                keyboard.release(key_obj)
+        for index, (op, key) in enumerate(action):
+            if op == PRESS:
+                keyboard.press(key)
+            elif op == RELEASE:
+                keyboard.release(key)
             else:
-                keyboard.press(actual_key)
-                keyboard.release(actual_key)
-            
-            # Small delay before releasing modifiers
-            time.sleep(0.01)
-            
-            # Release all modifiers in reverse order
-            for mod in reversed(modifiers):
-                keyboard.release(mod)
-            
-            return True
-        
-        # Original simple key press logic
-        modifiers = []
-        if ctrl:
-            modifiers.append(Key.ctrl)
-        if shift:
-            modifiers.append(Key.shift)
-        if alt:
-            modifiers.append(Key.alt)
-
-        for mod in modifiers:
-            keyboard.press(mod)
-
-        if key_name.lower() in SPECIAL_KEYS:
-            key_obj = SPECIAL_KEYS[key_name.lower()]
-            keyboard.press(key_obj)
-            keyboard.release(key_obj)
-        else:
-            keyboard.press(key_name)
-            keyboard.release(key_name)
+                keyboard.flush()
+                time.sleep(MODIFIER_SETTLE if op == SETTLE else key)
+        keyboard.flush()
+    except Exception:
+        held: List[Any] = []
+        for op, key in action[:index]:
+            if op == PRESS:
+                held.append(key)
+            elif op == RELEASE and key in held:
+                held.remove(key)
+        _release_quietly(held)
+        raise
 
-        for mod in reversed(modifiers):
-            keyboard.release(mod)
 
+def _release_quietly(keys: Sequence[Any]):
+    """Best-effort release of `keys` (last pressed first) after a failure"""
+    for key in reversed(keys):
+        try:
+            keyboard.release(key)
+        except Exception:
+            pass
+    try:
+        keyboard.flush()
+    except Exception:
+        pass
+
+
+def press_key(key_name: str, ctrl: bool = False, shift: bool = False, alt: bool = False) -> bool:
+    try:
+        run_action(resolve_action(key_name, ctrl, shift, alt))
+        return True
+    except Exception as e:
+        key_logger.warning("press_failed", extra={"fields": {"key": key_name, "error": str(e)}})
+        return False
+
+
+def compile_macro(steps: Sequence[Any]) -> KeyAction:
+    """Flatten macro steps into one key action (raises ValueError if a step is invalid)
+
+    A step is a key string such as "ctrl+c", or an object with `key`, optional `ctrl`/`shift`/`alt`
+    and `repeat`, and `delay_ms` to pause after it. An object with only `delay_ms` is a pause.
+    """
+    if not isinstance(steps, list) or not steps:
+        raise ValueError("a macro is a non-empty list of steps")
+    if len(steps) > MAX_MACRO_STEPS:
+        raise ValueError(f"more than {MAX_MACRO_STEPS} steps")
+    action: List[Tuple[int, Any]] = []
+    total_delay = 0.0
+    for index, step in enumerate(steps):
+        if isinstance(step, str):
+            step = {"key": step}
+        if not isinstance(step, dict):
+            raise ValueError(f"step {index}: expected a key string or an object")
+        key_name = step.get("key")
+        if key_name is not None:
+            repeat = step.get("repeat", 1)
+            if not isinstance(key_name, str) or not isinstance(repeat, int) or not 1 <= repeat <= 100:
+                raise ValueError(f"step {index}: invalid key or repeat")
+            action.extend(resolve_action(key_name, bool(step.get("ctrl")), bool(step.get("shift")),
+                                         bool(step.get("alt"))) * repeat)
+        delay_ms = step.get("delay_ms", 0)
+        if not isinstance(delay_ms, (int, float)) or delay_ms < 0:
+            raise ValueError(f"step {index}: invalid delay_ms")
+        if key_name is None and not delay_ms:
+            raise ValueError(f"step {index}: needs a key or a delay_ms")
+        if delay_ms:
+            action.append((PAUSE, delay_ms / 1000))
+            total_delay += delay_ms / 1000
+    if total_delay > MAX_MACRO_DELAY:
+        raise ValueError(f"delays add up to more than {MAX_MACRO_DELAY:g}s")
+    return tuple(action)
+
+
+def action_weight(action: KeyAction) -> int:
+    """Injector work in a compiled action, in key presses: each press, plus its pauses at the repeat interval"""
+    presses = sum(1 for op, _ in action if op == PRESS)
+    paused = sum(key for op, key in action if op == PAUSE)
+    return presses + int(paused / REPEAT_INTERVAL)
+
+
+def compile_macros(definitions: Dict[str, Any]) -> Dict[str, KeyAction]:
+    """Compile config.macros once; invalid macros are reported and left out"""
+    compiled: Dict[str, KeyAction] = {}
+    if not isinstance(definitions, dict):
+        print("Ignoring macros: expected an object of name -> steps")
+        return compiled
+    for name, steps in definitions.items():
+        try:
+            compiled[name] = compile_macro(steps)
+        except ValueError as e:
+            print(f"Ignoring macro '{name}': {e}")
+    return compiled
+
+
+def play_macro(name: str, action: KeyAction) -> bool:
+    """Run a compiled macro on the injector thread; after a failure no key it pressed stays held"""
+    try:
+        run_action(action)
         return True
     except Exception as e:
-        print(f"Error pressing key '{key_name}': {e}")
+        key_logger.warning("macro_failed", extra={"fields": {"macro": name, "error": str(e)}})
         return False
 
 
+# Named macros from config.macros, compiled at load and whenever the config changes
+macros: Dict[str, KeyAction] = compile_macros(config.macros)
+
+
+def _release_modifiers(modifiers: Tuple[Any, ...], settle: bool):
+    if settle and modifiers:
+        keyboard.flush()
+        time.sleep(MODIFIER_SETTLE)
+    for mod in reversed(modifiers):
+        keyboard.release(mod)
+
+
+def press_run(commands: Sequence[Tuple[str, bool, bool, bool, int]]) -> List[bool]:
+    """Inject a backlog of (key, ctrl, shift, alt, count) commands in one pass
+
+    Repeats go out back to back, and modifiers stay held across consecutive commands that
+    share them (ctrl+c, ctrl+v presses Ctrl once). Returns success per command. If the run
+    fails part-way, held modifiers are released and every command is reported failed, since
+    events a buffering backend had not flushed yet are lost.
+    """
+    results: List[bool] = []
+    held: Tuple[Any, ...] = ()
+    held_settle = False
+    try:
+        for key_name, ctrl, shift, alt, count in commands:
+            try:
+                modifiers, key_obj, settle = resolve_chord(key_name, ctrl, shift, alt)
+                # Unsupported keys fail here, before any of the command's events are buffered
+                for key in modifiers + (key_obj,):
+                    keyboard.check(key)
+            except ValueError as e:
+                key_logger.warning("press_failed", extra={"fields": {"key": key_name, "error": str(e)}})
+                results.append(False)
+                continue
+            if modifiers != held:
+                _release_modifiers(held, held_settle)
+                for mod in modifiers:
+                    keyboard.press(mod)
+                if settle and modifiers:
+                    keyboard.flush()
+                    time.sleep(MODIFIER_SETTLE)
+                held, held_settle = modifiers, settle
+            for _ in range(count):
+                keyboard.press(key_obj)
+                keyboard.release(key_obj)
+            results.append(True)
+        _release_modifiers(held, held_settle)
+        keyboard.flush()
+    except Exception as e:
+        key_logger.warning("press_failed", extra={"fields": {"key": "run", "error": str(e)}})
+        _release_quietly(held)
+        results = [False] * len(commands)
+    return results
+
+
+# Characters typed as key presses rather than through Controller.type
+TEXT_KEYS = {'\r\n': 'enter', '\n': 'enter', '\r': 'enter', '\t': 'tab'}
+_TEXT_SEGMENTS = re.compile(r'(\r\n|[\r\n\t])')
+# Pacing granularity when a characters-per-second ceiling applies (seconds)
+TYPE_PACING_SLICE = 0.05
+MAX_TYPING_JOBS = 32
+# Most raw JSON bytes one byte of /type text can take: a control character escapes to "\u0001"
+JSON_ESCAPE_FACTOR = 6
+# Paste shortcut when config.paste_chord is empty
+DEFAULT_PASTE_CHORD = "cmd+v" if sys.platform == 'darwin' else "ctrl+v"
+# Time the focused application gets to read the clipboard before it is restored (seconds)
+PASTE_RESTORE_DELAY = 0.25
+
+
+class TypingJob:
+    """Progress of one /type request"""
+
+    def __init__(self, text: str, chars_per_second: float, mode: str = "type"):
+        self.id = uuid.uuid4().hex[:12]
+        self.text = text
+        self.chars_per_second = chars_per_second
+        self.mode = mode
+        self.total = len(text)
+        self.typed = 0
+        self.status = "queued"
+        self.error: Optional[str] = None
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    def as_dict(self) -> Dict[str, Any]:
+        elapsed = None
+        if self.started_at:
+            elapsed = round((self.finished_at or time.time()) - self.started_at, 3)
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "mode": self.mode,
+            "typed": self.typed,
+            "total": self.total,
+            "elapsed": elapsed,
+            "error": self.error,
+        }
+
+
+typing_jobs: "OrderedDict[str, TypingJob]" = OrderedDict()
+
+
+def type_chunk_size(cps: float) -> int:
+    """Characters typed per step: type_chunk_size, smaller when paced so each step is TYPE_PACING_SLICE long"""
+    if cps:
+        return max(1, min(config.type_chunk_size, int(cps * TYPE_PACING_SLICE)))
+    return max(1, config.type_chunk_size)
+
+
+def type_step_count(job: TypingJob) -> int:
+    """Steps type_text takes for the job: one per chunk and one per enter or tab"""
+    chunk_size = type_chunk_size(job.chars_per_second)
+    return sum(1 if segment in TEXT_KEYS else -(-len(segment) // chunk_size)
+               for segment in _TEXT_SEGMENTS.split(job.text) if segment)
+
+
+def type_text(job: TypingJob) -> Generator[Optional[float], None, bool]:
+    """Type a block of text in chunks, honouring the job's characters-per-second ceiling
+
+    A generator for InjectionWorker.submit_steps: it yields after every chunk, so other clients'
+    keys are injected between chunks of a long text. When paced, it yields the time the next chunk
+    is due and the worker parks the job until then. Returns whether all of it was typed.
+    """
+    job.status = "typing"
+    job.started_at = time.time()
+    start = time.perf_counter()
+    cps = job.chars_per_second
+    chunk_size = type_chunk_size(cps)
+
+    def advance(count: int) -> Optional[float]:
+        job.typed += count
+        return start + job.typed / cps if cps else None
+
+    try:
+        for segment in _TEXT_SEGMENTS.split(job.text):
+            if not segment:
+                continue
+            if segment in TEXT_KEYS:
+                if not press_key(TEXT_KEYS[segment]):
+                    raise RuntimeError(f"Failed to press {TEXT_KEYS[segment]}")
+                yield advance(len(segment))
+                continue
+            for i in range(0, len(segment), chunk_size):
+                chunk = segment[i:i + chunk_size]
+                keyboard.type(chunk)
+                yield advance(len(chunk))
+        job.status = "done"
+    except Exception as e:
+        job.status = "failed"
+        job.error = str(e)
+        key_logger.warning("type_failed", extra={"fields": {"job": job.id, "at": job.typed, "error": str(e)}})
+    job.finished_at = time.time()
+    return job.status == "done"
+
+
+# Host clipboard used by paste mode
+clipboard = create_clipboard()
+# Stands in for the host clipboard while the recording backend is injecting, so tests and
+# benchmarks never overwrite the user's clipboard
+memory_clipboard = MemoryClipboard()
+# Clipboard text to put back after the last paste, the clipboard it goes to, and the timer that will do it
+_paste_lock = threading.Lock()
+_pending_restore: Optional[Tuple[threading.Timer, str, Clipboard]] = None
+
+
+def paste_clipboard() -> Clipboard:
+    """The clipboard paste mode uses with the current injection backend"""
+    return memory_clipboard if keyboard.name == RecordingBackend.name else clipboard
+
+
+def _restore_clipboard():
+    """Timer callback: put the pre-paste text back unless another paste has taken over"""
+    global _pending_restore
+    with _paste_lock:
+        if _pending_restore is None or _pending_restore[0] is not threading.current_thread():
+            return
+        _, text, board = _pending_restore
+        _pending_restore = None
+        try:
+            board.set(text)
+        except OSError as e:
+            key_logger.warning("paste_restore_failed", extra={"fields": {"error": str(e)}})
+
+
+def _schedule_restore(text: str, board: Clipboard):
+    """Put `text` back on `board` PASTE_RESTORE_DELAY from now, replacing any pending restore"""
+    global _pending_restore
+    timer = threading.Timer(PASTE_RESTORE_DELAY, _restore_clipboard)
+    timer.daemon = True
+    with _paste_lock:
+        _pending_restore = (timer, text, board)
+    timer.start()
+
+
+def paste_text(job: TypingJob) -> Generator[Optional[float], None, bool]:
+    """Paste a block of text through the clipboard with one paste chord, in time independent of its length
+
+    With paste_restore_clipboard, the previous clipboard text is put back PASTE_RESTORE_DELAY later,
+    off the injector thread; back-to-back pastes restore the text from before the first one. If the
+    clipboard cannot be written, the text is typed instead, and a restore that was pending is
+    scheduled again so the text from before the earlier paste is not lost. With the recording
+    backend, an in-memory clipboard is used (see paste_clipboard).
+    """
+    global _pending_restore
+    job.status = "typing"
+    job.started_at = time.time()
+    board = paste_clipboard()
+    with _paste_lock:
+        previous = None
+        pending = _pending_restore
+        if pending is not None:
+            pending[0].cancel()
+            _pending_restore = None
+            if pending[2] is board:
+                previous = pending[1]
+            else:
+                # The backend changed since that paste: its text goes back to its own clipboard now
+                try:
+                    pending[2].set(pending[1])
+                except OSError as e:
+                    key_logger.warning("paste_restore_failed", extra={"fields": {"error": str(e)}})
+                pending = None
+        try:
+            if previous is None and config.paste_restore_clipboard:
+                previous = board.get()
+            board.set(job.text)
+            error = None
+        except OSError as e:
+            error = e
+    if error is not None:
+        key_logger.warning("paste_unavailable", extra={"fields": {"job": job.id, "error": str(error)}})
+        if pending is not None:
+            _schedule_restore(pending[1], board)
+        job.mode = "type"
+        return (yield from type_text(job))
+
+    chord = config.paste_chord or DEFAULT_PASTE_CHORD
+    if press_key(chord):
+        job.typed = job.total
+        job.status = "done"
+    else:
+        job.status = "failed"
+        job.error = f"Failed to press {chord}"
+    if previous is not None:
+        _schedule_restore(previous, board)
+    job.finished_at = time.time()
+    return job.status == "done"
+
+
+# Dedicated thread that runs press_key in FIFO order, off the event loop
+injector = InjectionWorker(press_key, latency=latency, run_fn=press_run, max_pending=config.max_pending_keys,
+                           max_pending_per_client=config.max_pending_per_client)
+injector.stale_keys = NAVIGATION_KEYS
+injector.stale_after_ns = int(config.stale_navigation_ms * 1e6)
+# Generates repeats for held keys ('down' ... 'up') through the injector
+repeater = RepeatScheduler(injector.submit, config.key_repeat_delay, config.key_repeat_rate,
+                           config.key_hold_timeout)
+
+
+_warm_up_lock = threading.Lock()
+_warmed_up = False
+
+
+def warm_up():
+    """Do the first keystroke's one-time work ahead of time (idempotent, thread-safe)
+
+    Compiles the plain action of every named key, letter and digit, and lets the injection
+    backend open its device or load its keyboard mapping.
+    """
+    global _warmed_up
+    with _warm_up_lock:
+        if _warmed_up:
+            return
+        with profile.step("warm up injection"):
+            for key_name in [*SPECIAL_KEYS, *string.ascii_lowercase, *string.digits]:
+                try:
+                    resolve_action(key_name)
+                except ValueError:
+                    pass
+            try:
+                keyboard.warm_up()
+            except Exception as e:
+                print(f"Injection backend warm-up failed: {e}")
+        _warmed_up = True
+
+
+def startup_report() -> str:
+    """Startup profile, including the first injected key once there has been one"""
+    if injector.first_injected_at is not None and not profile.has("first key injected"):
+        profile.mark("first key injected", at=injector.first_injected_at)
+    return profile.report()
+
+
+def submit_key(client: str, key: str, ctrl: bool = False, shift: bool = False, alt: bool = False,
+               repeat: int = 1, event: str = 'press', submit: Optional[Callable[..., Future]] = None) -> Future:
+    """Queue a key press on the client's queue, or start/end a held key for 'down'/'up' events
+
+    A press ends the client's hold first, so repeats of a held key do not mix with typed keys.
+    Presses go through `submit` when given (a batch's Reservation), otherwise injector.submit.
+    """
+    submit = submit or injector.submit
+    if event == 'down':
+        return repeater.hold(client, key, ctrl, shift, alt, submit)
+    if event == 'up':
+        repeater.release(client, key)
+        future: Future = Future()
+        future.set_result(True)
+        return future
+    if repeater.active:
+        repeater.release(client)
+    return submit(key, ctrl, shift, alt, repeat, client)
+
+
 @app.get("/health")
 async def health_check() -> Dict[str, str]:
     return {"status": "running", "version": VERSION}
@@ -304,40 +1109,500 @@ async def server_info() -> Dict[str, Any]:
     return {
         "os": get_os_name(),
         "ip": get_local_ip(),
+        "addresses": network.info,
         "port": config.port,
         "version": VERSION
     }
 
 
+@app.get("/stats")
+async def server_stats() -> Dict[str, Any]:
+    return {
+        **stats.as_dict(),
+        "blocked": allow_list.blocked,
+        "sessions": len(sessions.active()),
+        "queue_depth": injector.depth,
+        "pending_keys": injector.pending,
+        "rejected": injector.rejected,
+        "held_keys": repeater.active,
+        "key_repeats": repeater.repeats,
+        "key_repeats_skipped": repeater.skipped,
+        "holds_expired": repeater.expired,
+        "coalesced": injector.coalesced,
+        "dropped_stale": injector.dropped,
+        "key_log_dropped": _key_log_handler.dropped,
+        "log_events_dropped": log_events_dropped,
+    }
+
+
+@app.get("/sessions")
+async def list_sessions() -> List[Dict[str, Any]]:
+    """Connected clients with their key rate and queued presses, busiest first"""
+    return sessions.snapshot(injector.pending_by_client())
+
+
+@app.get("/stats/latency")
+async def latency_stats() -> Dict[str, Dict[str, Any]]:
+    """Per-stage key path latency (milliseconds)"""
+    return latency.summary()
+
+
+def _render_metrics():
+    """Yield the Prometheus exposition one family at a time from snapshots of the counters"""
+    yield prometheus_family("keyote_keys_injected_total", "counter", "Key presses injected", [({}, injector.injected)])
+    yield prometheus_family("keyote_injection_failures_total", "counter", "Key presses press_key could not inject",
+                            [({}, injector.failed)])
+    yield prometheus_family("keyote_requests_total", "counter", "HTTP requests by endpoint",
+                            [({"endpoint": path}, count) for path, count in list(stats.requests.items())])
+    yield prometheus_family("keyote_transport_keys_total", "counter", "Key commands received by transport", [
+        ({"transport": "http"}, stats.http_keys),
+        ({"transport": "ws"}, stats.ws_frames),
+        ({"transport": "udp"}, stats.udp_datagrams),
+    ])
+    yield prometheus_family("keyote_coalesced_commands_total", "counter",
+                            "Queued commands merged into an identical neighbour", [({}, injector.coalesced)])
+    yield prometheus_family("keyote_stale_dropped_total", "counter",
+                            "Queued navigation keys dropped past the freshness deadline", [({}, injector.dropped)])
+    yield prometheus_family("keyote_key_repeats_total", "counter", "Autorepeat presses generated for held keys",
+                            [({}, repeater.repeats)])
+    yield prometheus_family("keyote_key_repeats_skipped_total", "counter",
+                            "Autorepeats skipped because the previous one was still queued or the queue was full",
+                            [({}, repeater.skipped)])
+    yield prometheus_family("keyote_holds_expired_total", "counter",
+                            "Held keys released after key_hold_timeout without a key-up", [({}, repeater.expired)])
+    yield prometheus_family("keyote_held_keys", "gauge", "Keys currently held for autorepeat", [({}, repeater.active)])
+    yield prometheus_family("keyote_rejected_total", "counter", "Submissions refused because the queue was full",
+                            [({}, injector.rejected)])
+    yield prometheus_family("keyote_pending_keys", "gauge", "Key presses waiting for injection", [({}, injector.pending)])
+    yield prometheus_family("keyote_queue_depth", "gauge", "Jobs waiting for the injection thread", [({}, injector.depth)])
+    yield prometheus_family("keyote_key_log_dropped_total", "counter",
+                            "Key log records dropped because the writer fell behind", [({}, _key_log_handler.dropped)])
+    yield prometheus_family("keyote_log_events_dropped_total", "counter",
+                            "Dashboard log events overwritten before the dashboard read them", [({}, log_events_dropped)])
+    yield prometheus_family("keyote_blocked_total", "counter", "Requests and datagrams from addresses outside allowed_ips",
+                            [({}, allow_list.blocked)])
+    yield prometheus_family("keyote_active_sessions", "gauge", "Clients seen recently or with an open stream",
+                            [({}, len(sessions.active()))])
+    yield prometheus_family("keyote_connected_clients", "gauge", "Open keystroke streams", [({}, stats.ws_clients)])
+    yield prometheus_family("keyote_uptime_seconds", "gauge", "Seconds since the server started",
+                            [({}, round(time.time() - stats.started_at, 3))])
+    yield from prometheus_histograms("keyote_key_latency_seconds", "Key path latency by stage", latency)
+
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus text exposition; rendered incrementally off the event loop"""
+    return StreamingResponse(_render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 @app.post("/key")
-async def handle_key(command: KeyCommand, request: Request) -> Dict[str, str]:
+async def handle_key(request: Request) -> Dict[str, str]:
+    """Inject one key command, sent as JSON or as a binary key frame"""
+    started_ns = time.perf_counter_ns()
+    received_ns = getattr(request.state, 'received_ns', None)
+    if received_ns:
+        latency.record("http", started_ns - received_ns)
+
+    body = await request.body()
+    if request.headers.get('content-type', '').startswith(KEY_FRAME_CONTENT_TYPE):
+        if len(body) != FRAME_SIZE:
+            raise HTTPException(status_code=422, detail="Expected exactly one key frame")
+        try:
+            command = decode_frame(body)
+        except FrameError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+    else:
+        try:
+            command = KeyCommand.model_validate_json(body)
+        except ValidationError as e:
+            raise RequestValidationError([
+                {**error, 'loc': ('body', *error['loc'])}
+                for error in e.errors(include_url=False, include_context=False)
+            ])
+    latency.record("parse", time.perf_counter_ns() - started_ns)
+
     client_ip = request.client.host if request.client else "unknown"
+    return await accept_key(command, client_ip, request.headers.get(CLIENT_ID_HEADER),
+                            request.headers.get('x-keyote-sent-at'))
+
+
+async def accept_key(command: Any, client_ip: str, client_id: Optional[str],
+                     sent_at: Optional[str]) -> Dict[str, str]:
+    """Queue a parsed key command (KeyCommand, KeyFrame or KeyRequest) for an HTTP client"""
+    try:
+        record_network_latency(float(sent_at) if sent_at else getattr(command, 'sent_at', None))
+    except ValueError:
+        pass
+
+    try:
+        # Rejects unknown keys and modifiers, and keys the backend cannot inject, before anything is queued
+        check_chord(command.key, command.ctrl, command.shift, command.alt)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    session = sessions.touch(client_ip, client_id, "http")
+    stats.http_keys += 1
     
-    log_request(client_ip, command.key, command.ctrl, command.shift, command.alt)
-
-    for i in range(command.repeat):
-        success = press_key(command.key, command.ctrl, command.shift, command.alt)
-        if not success:
-            raise HTTPException(
-                status_code=500,
-                detail=f"Failed to simulate key: {command.key}"
-            )
-        if command.repeat > 1 and i < command.repeat - 1:
-            import time
-            time.sleep(0.01)
+    log_request(client_ip, command.key, command.ctrl, command.shift, command.alt, command.event)
+
+    enqueue_ns = time.perf_counter_ns()
+    future = submit_key(session.key, command.key, command.ctrl, command.shift, command.alt,
+                        command.repeat, command.event)
+    latency.record("enqueue", time.perf_counter_ns() - enqueue_ns)
+    if not command.wait:
+        return {"status": "queued", "key": command.key}
+
+    success = await asyncio.wrap_future(future)
+    if not success:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to simulate key: {command.key}"
+        )
 
     return {"status": "ok", "key": command.key}
 
 
+async def fast_key(body: bytes, headers: Dict[bytes, bytes], client_ip: str):
+    """KeyFastPath handler: plain JSON or frame bodies are served here, anything else goes to handle_key"""
+    started_ns = time.perf_counter_ns()
+    if headers.get(b'content-type', b'').startswith(KEY_FRAME_CONTENT_TYPE_BYTES):
+        if len(body) != FRAME_SIZE:
+            return None
+        try:
+            command = decode_frame(body)
+        except FrameError:
+            return None
+    else:
+        command = parse_key_request(body)
+        if command is None:
+            return None
+    latency.record("parse", time.perf_counter_ns() - started_ns)
+    stats.requests['/key'] = stats.requests.get('/key', 0) + 1
+
+    client_id = headers.get(b'x-keyote-client')
+    sent_at = headers.get(b'x-keyote-sent-at')
+    try:
+        result = await accept_key(command, client_ip, client_id.decode('latin-1') if client_id else None,
+                                  sent_at.decode('latin-1') if sent_at else None)
+    except RequestTooLargeError as e:
+        return 413, encode_json({"detail": str(e)}), []
+    except QueueFullError as e:
+        return 429, encode_json({"detail": str(e)}), [(b"retry-after", str(e.retry_after).encode())]
+    except HTTPException as e:
+        return e.status_code, encode_json({"detail": e.detail}), []
+    latency.record("total", time.perf_counter_ns() - started_ns)
+    return 200, encode_key_response(result["status"], result["key"]), []
+
+
+@app.post("/keys")
+async def handle_keys(
+    request: Request,
+    commands: List[Dict[str, Any]] = Body(...),
+    wait: bool = Query(default=False),
+) -> Dict[str, Any]:
+    """Inject an ordered batch of key commands in one pass, reporting per-item status"""
+    if len(commands) > config.max_batch_size:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch too large: {len(commands)} > {config.max_batch_size}"
+        )
+
+    client_ip = request.client.host if request.client else "unknown"
+    results: List[Dict[str, Any]] = []
+    valid: List[KeyCommand] = []
+    for index, item in enumerate(commands):
+        try:
+            command = KeyCommand.model_validate(item)
+        except ValidationError as e:
+            results.append({"index": index, "status": "invalid", "error": str(e.errors()[0]['msg'])})
+            continue
+        try:
+            check_chord(command.key, command.ctrl, command.shift, command.alt)
+        except ValueError as e:
+            results.append({"index": index, "status": "invalid", "error": str(e)})
+            continue
+        results.append({"index": index, "status": "queued", "key": command.key})
+        valid.append(command)
+
+    # A held key's first press counts like a press; an 'up' queues nothing
+    presses = sum(c.repeat if c.event == 'press' else c.event == 'down' for c in valid)
+    limit = injector.admission_limit
+    if limit and presses > limit:
+        # Larger than the pending limit, so it could never be queued whatever the backlog
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch too large: {presses} key presses > {limit}"
+        )
+
+    session = sessions.touch(client_ip, request.headers.get(CLIENT_ID_HEADER), "http", keys=0)
+    # The whole batch is admitted at once (or refused with 429), never part of it
+    if all(c.event == 'press' for c in valid):
+        futures = injector.submit_many(
+            ((c.key, c.ctrl, c.shift, c.alt, c.repeat) for c in valid), client=session.key
+        )
+        if valid and repeater.active:
+            repeater.release(session.key)
+    else:
+        room = injector.reserve(presses, session.key)
+        try:
+            futures = [submit_key(session.key, c.key, c.ctrl, c.shift, c.alt, c.repeat, c.event, room.submit)
+                       for c in valid]
+        finally:
+            room.release()
+
+    session.record(len(valid))
+    stats.http_keys += len(valid)
+    for command in valid:
+        log_request(client_ip, command.key, command.ctrl, command.shift, command.alt, command.event)
+
+    if wait:
+        queued = (r for r in results if r["status"] == "queued")
+        for result, future in zip(queued, futures):
+            success = await asyncio.wrap_future(future)
+            result["status"] = "ok" if success else "failed"
+
+    return {"status": "ok", "count": len(valid), "results": results}
+
+
+@app.get("/macros")
+async def list_macros() -> List[str]:
+    """Names of the configured macros"""
+    return list(macros)
+
+
+@app.post("/macro/{name}")
+async def handle_macro(name: str, request: Request, wait: bool = Query(default=False)) -> Dict[str, str]:
+    """Run a configured macro as one job: no other key is injected in between"""
+    action = macros.get(name)
+    if action is None:
+        raise HTTPException(status_code=404, detail=f"Unknown macro: {name}")
+
+    client_ip = request.client.host if request.client else "unknown"
+    session = sessions.touch(client_ip, request.headers.get(CLIENT_ID_HEADER), "http")
+    key_logger.info("macro", extra={"fields": {"client": client_ip, "macro": name}})
+    gui_log(f"Mobile → Macro '{name}'")
+
+    future = injector.submit_call(lambda: play_macro(name, action), label="macro", client=session.key,
+                                  weight=action_weight(action))
+    if not wait:
+        return {"status": "queued", "macro": name}
+
+    if not await asyncio.wrap_future(future):
+        raise HTTPException(status_code=500, detail=f"Failed to run macro: {name}")
+    return {"status": "ok", "macro": name}
+
+
+@app.post("/type")
+async def handle_type(body: TypeRequest, request: Request) -> Dict[str, Any]:
+    """Type or paste a block of text as one job; poll GET /type/{job_id} for progress"""
+    size = len(body.text.encode('utf-8'))
+    if size > config.max_type_bytes:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Text too large: {size} > {config.max_type_bytes} bytes"
+        )
+
+    chars_per_second = body.chars_per_second or config.type_chars_per_second
+    if config.type_chars_per_second:
+        chars_per_second = min(chars_per_second, config.type_chars_per_second)
+    if chars_per_second:
+        chars_per_second = max(chars_per_second, MIN_CHARS_PER_SECOND)
+
+    mode = body.mode
+    if mode == 'auto':
+        # An explicit typing speed asks for keystrokes
+        paste = (config.type_paste_threshold > 0 and len(body.text) >= config.type_paste_threshold
+                 and not body.chars_per_second)
+        mode = 'paste' if paste else 'type'
+    if mode == 'type':
+        try:
+            for char in set(body.text) - set(TEXT_KEYS):
+                keyboard.check(char)
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+
+    job = TypingJob(body.text, chars_per_second, mode)
+    client_ip = request.client.host if request.client else "unknown"
+    session = sessions.touch(client_ip, request.headers.get(CLIENT_ID_HEADER), "http", keys=0)
+    run = paste_text if mode == 'paste' else type_text
+    # A paste is one chord however long the text; typing weighs one press per chunk
+    weight = 1 if mode == 'paste' else type_step_count(job)
+    # Raises QueueFullError (429) before the job becomes visible to GET /type/{job_id}
+    future = injector.submit_steps(run(job), label=mode, client=session.key, weight=weight)
+    typing_jobs[job.id] = job
+    while len(typing_jobs) > MAX_TYPING_JOBS:
+        typing_jobs.popitem(last=False)
+
+    key_logger.info("type", extra={"fields": {"client": client_ip, "job": job.id, "chars": job.total, "mode": mode}})
+    gui_log(f"Mobile → {'Pasting' if mode == 'paste' else 'Typing'} {job.total} characters")
+
+    if body.wait:
+        await asyncio.wrap_future(future)
+    return job.as_dict()
+
+
+@app.get("/type/{job_id}")
+async def type_status(job_id: str) -> Dict[str, Any]:
+    job = typing_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown typing job: {job_id}")
+    return job.as_dict()
+
+
+async def _ack_key_stream(websocket: WebSocket, pending: Deque[Tuple[int, Optional[Future]]],
+                          wakeup: asyncio.Event):
+    """Send one ack per batch of frames that finished injecting since the last ack"""
+    while True:
+        await wakeup.wait()
+        wakeup.clear()
+
+        last_seq = 0
+        count = 0
+        failed = []
+        while pending:
+            seq, future = pending.popleft()
+            success = False
+            if future is not None:
+                try:
+                    success = await asyncio.wrap_future(future)
+                except Exception:
+                    success = False
+            if not success:
+                failed.append(seq)
+            last_seq = seq
+            count += 1
+
+        await websocket.send_json({"type": "ack", "seq": last_seq, "count": count, "failed": failed,
+                                   "queue_depth": injector.pending})
+
+
+@app.websocket("/ws")
+async def key_stream(websocket: WebSocket):
+    """Persistent keystroke stream: JSON text frames or binary key frames in, batched acks out"""
+    await websocket.accept()
+    client_ip = websocket.client.host if websocket.client else "unknown"
+    # Browsers cannot set headers on a WebSocket, so the client id may also come as ?client=
+    client_id = websocket.query_params.get('client') or websocket.headers.get(CLIENT_ID_HEADER)
+    session = sessions.touch(client_ip, client_id, "ws", keys=0)
+    session.streams += 1
+    gui_log(f"Stream connected: {client_ip}")
+
+    pending: Deque[Tuple[int, Optional[Future]]] = deque()
+    wakeup = asyncio.Event()
+    acker = asyncio.create_task(_ack_key_stream(websocket, pending, wakeup))
+    last_seq = 0
+    frame_buffer = KeyFrame()
+    stats.ws_clients += 1
+
+    def accept(seq: int, command: Optional[Any]):
+        nonlocal last_seq
+        # Sequence numbers are per connection and strictly increasing; replays are dropped
+        if seq <= last_seq:
+            return
+        last_seq = seq
+        stats.ws_frames += 1
+        session.record()
+        if command is not None:
+            try:
+                check_chord(command.key, command.ctrl, command.shift, command.alt)
+            except ValueError:
+                command = None
+        if command is None:
+            pending.append((seq, None))
+        else:
+            log_request(client_ip, command.key, command.ctrl, command.shift, command.alt, command.event)
+            try:
+                future = submit_key(session.key, command.key, command.ctrl, command.shift, command.alt,
+                                    command.repeat, command.event)
+            except QueueFullError:
+                future = None
+            pending.append((seq, future))
+        wakeup.set()
+
+    try:
+        while True:
+            message = await websocket.receive()
+            if message['type'] == 'websocket.disconnect':
+                raise WebSocketDisconnect(message.get('code', 1000))
+
+            if message.get('bytes') is not None:
+                try:
+                    for frame in iter_frames(message['bytes'], frame_buffer):
+                        accept(frame.seq, frame)
+                except FrameError:
+                    pass
+                continue
+
+            try:
+                data = json.loads(message.get('text') or '')
+                seq = data['seq']
+            except (ValueError, TypeError, KeyError):
+                continue
+            if not isinstance(seq, int):
+                continue
+            try:
+                command = KeyCommand.model_validate(data)
+            except ValidationError:
+                command = None
+            accept(seq, command)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        acker.cancel()
+        session.streams -= 1
+        if not session.streams:
+            # A held key belongs to the stream, so it is released when the last one closes
+            repeater.release(session.key)
+        stats.ws_clients -= 1
+        gui_log(f"Stream disconnected: {client_ip}")
+
+
+def _dispatch_datagram(client_ip: str, command: Tuple[str, bool, bool, bool, int, str]):
+    key, ctrl, shift, alt, repeat, event = command
+    try:
+        check_chord(key, ctrl, shift, alt)
+    except ValueError:
+        return
+    log_request(client_ip, key, ctrl, shift, alt, event)
+    session = sessions.touch(client_ip, None, "udp")
+    try:
+        submit_key(session.key, key, ctrl, shift, alt, repeat, event)
+    except QueueFullError:
+        pass
+
+
+async def open_udp() -> Optional[asyncio.DatagramTransport]:
+    """Start the UDP key listener if udp_port is configured"""
+    if not config.udp_port:
+        return None
+    return await open_udp_listener(config.host, config.udp_port, _dispatch_datagram, stats,
+                                   allow=allow_list.allows)
+
+
+@app.exception_handler(QueueFullError)
+async def queue_full_handler(request: Request, exc: QueueFullError):
+    if isinstance(exc, RequestTooLargeError):
+        # Waiting would not help, so no Retry-After
+        return JSONResponse(status_code=413, content={"detail": str(exc)})
+    return JSONResponse(
+        status_code=429,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
+
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
+    # Runs outside the HTTP middleware, so the queue depth header is added here
     return JSONResponse(
         status_code=500,
-        content={"error": str(exc)}
+        content={"error": str(exc)},
+        headers={QUEUE_DEPTH_HEADER: str(injector.pending)}
     )
 
 
 def main():
+    import uvicorn
     try:
         uvicorn.run(
             app,
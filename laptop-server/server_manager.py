@@ -3,27 +3,50 @@ Server Manager - Controls FastAPI server lifecycle in background thread
 Provides thread-safe start/stop/status management for GUI integration
 """
 
+import asyncio
 import threading
-import uvicorn
-from typing import Optional, Callable
+import time
+from concurrent.futures import Future
+from typing import TYPE_CHECKING, Optional, Callable
 import signal
 import sys
 import logging
 import traceback
 
+from startup_profile import profile
+
+if TYPE_CHECKING:
+    import uvicorn
+
 logger = logging.getLogger(__name__)
 
+# Seconds stop() lets open requests and streams finish before connections are dropped
+SHUTDOWN_DEADLINE = 2.0
+# Extra seconds after the deadline before uvicorn is forced out: forcing it skips the lifespan
+# shutdown, which stops the key repeater, the injector and the key log
+FORCE_EXIT_MARGIN = 1.0
+# Binding the UDP port again after a rebind is retried while the old socket is released
+UDP_REBIND_ATTEMPTS = 5
+UDP_REBIND_RETRY_DELAY = 0.05
+
 
 class ServerManager:
     """Manages FastAPI server lifecycle with thread-safe controls"""
     
     def __init__(self):
-        self.server: Optional[uvicorn.Server] = None
+        self.server: Optional["uvicorn.Server"] = None
         self.thread: Optional[threading.Thread] = None
         self.port: int = 5000
         self.host: str = "0.0.0.0"
         self.is_running: bool = False
         self.status_callback: Optional[Callable] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.udp_transport: Optional[asyncio.DatagramTransport] = None
+        self.udp_port: int = 0
+        self.shutdown_deadline: float = SHUTDOWN_DEADLINE
+        # Resolves when start() returns, i.e. the server has fully stopped
+        self._stopped: Future = Future()
+        self._stopped.set_result(True)
         
     def set_status_callback(self, callback: Callable):
         """Set callback for status updates"""
@@ -34,6 +57,17 @@ class ServerManager:
         if self.status_callback:
             self.status_callback(status)
             
+    def preload(self):
+        """Import the server stack and warm up injection ahead of start(); returns the server module
+
+        Safe to run on a background thread: a concurrent start() waits on the import lock.
+        """
+        for name in ("pydantic", "fastapi", "uvicorn", "pynput.keyboard"):
+            profile.import_module(name)
+        server = profile.import_module("server")
+        server.warm_up()
+        return server
+
     def start(self):
         """Start the FastAPI server in current thread"""
         logger.info(f"ServerManager.start() called - port={self.port}, host={self.host}")
@@ -41,16 +75,23 @@ class ServerManager:
         if self.is_running:
             logger.warning("Server already running")
             return
+        self._stopped = Future()
             
         try:
-            # Import server app
+            # Import server app (already loaded if preload() has run)
             logger.info("Importing server app")
-            from server import app, config
+            import uvicorn
+            from server import app, config, config_store, reload_config
             logger.info("Server app imported successfully")
             
+            # Pick up settings saved since the last start (e.g. allowed_ips)
+            reload_config()
+            # Later saves are applied while running; listener changes rebind in place
+            config_store.add_listener(self._on_config_changed)
+            
             # Update config
             config.port = self.port
-            config.host = self.host
+            self.host = config.host
             logger.info(f"Config updated: port={config.port}, host={config.host}")
             
             # Create uvicorn server
@@ -61,7 +102,8 @@ class ServerManager:
                 port=self.port,
                 log_config=None,  # Disable uvicorn's logging (fixes GUI app crash)
                 access_log=False,
-                timeout_keep_alive=30
+                timeout_keep_alive=30,
+                timeout_graceful_shutdown=self.shutdown_deadline
             )
             
             self.server = uvicorn.Server(uvicorn_config)
@@ -69,8 +111,8 @@ class ServerManager:
             self._notify_status("running")
             logger.info("Starting uvicorn server.run()")
             
-            # Run server (blocking)
-            self.server.run()
+            # Run server alongside the optional UDP listener (blocking)
+            asyncio.run(self._serve())
             logger.info("Server.run() returned")
             
         except Exception as e:
@@ -79,34 +121,196 @@ class ServerManager:
             self.is_running = False
             self._notify_status(f"error: {e}")
             raise
+        finally:
+            self.is_running = False
+            self.server = None
+            if not self._stopped.done():
+                self._stopped.set_result(True)
             
-    def stop(self):
-        """Stop the FastAPI server"""
+    async def _serve(self):
+        """Serve HTTP and, when configured, UDP key datagrams on one event loop"""
+        from server import config, open_udp, stop_injection
+        self.loop = asyncio.get_running_loop()
+        self.udp_transport = await open_udp()
+        self.udp_port = config.udp_port if self.udp_transport else 0
+        try:
+            await self.server.serve()
+        finally:
+            self.loop = None
+            # A forced exit skips the lifespan shutdown; nothing may keep injecting once stopped
+            stop_injection()
+            if self.udp_transport:
+                self.udp_transport.close()
+                self.udp_transport = None
+                logger.info("UDP listener closed")
+
+    def _on_config_changed(self, data: dict, changed: set):
+        """Config store listener: move the listeners when port, host or udp_port change"""
+        loop = self.loop
+        if not self.is_running or loop is None or not changed & {'port', 'host', 'udp_port'}:
+            return
+        host = data.get('host', self.host)
+        port = data.get('port', self.port)
+        asyncio.run_coroutine_threadsafe(self._rebind(host, port, 'udp_port' in changed), loop)
+
+    async def _rebind(self, host: str, port: int, udp: bool):
+        """Listen on a new address without restarting: open connections and sessions are kept"""
+        server = self.server
+        if server is None or not server.started:
+            return
+        host_changed = host != self.host
+        if (host, port) != (self.host, self.port):
+            try:
+                await self._rebind_http(server, host, port)
+                self.host, self.port = host, port
+                logger.info(f"Now listening on {host}:{port}")
+                self._notify_status(f"rebound: {host}:{port}")
+            except OSError as e:
+                # /info and the UDP listener should describe where the server really is
+                from server import config, gui_log
+                config.host, config.port = self.host, self.port
+                if not server.servers:
+                    logger.error(f"Could not listen on {host}:{port} or go back to {self.host}:{self.port}: {e}")
+                    gui_log(f"Could not listen on {host}:{port} or {self.host}:{self.port}, stopping the server: {e}")
+                    self.stop_async()
+                    self._notify_status(f"error: no longer listening: {e}")
+                    return
+                logger.error(f"Could not listen on {host}:{port}, keeping {self.host}:{self.port}: {e}")
+                gui_log(f"Could not listen on {host}:{port}, still on {self.host}:{self.port}: {e}")
+                self._notify_status(f"error: could not listen on {host}:{port}: {e}")
+        if udp or host_changed:
+            await self._reopen_udp()
+
+    async def _reopen_udp(self):
+        """Move the UDP listener to the configured host/udp_port, retrying while the old socket lets go"""
+        from server import config, gui_log, open_udp
+        from udp_listener import close_udp_listener
+        if self.udp_transport:
+            await close_udp_listener(self.udp_transport)
+            self.udp_transport = None
+        for attempt in range(UDP_REBIND_ATTEMPTS):
+            try:
+                self.udp_transport = await open_udp()
+                break
+            except OSError as e:
+                if attempt + 1 < UDP_REBIND_ATTEMPTS:
+                    await asyncio.sleep(UDP_REBIND_RETRY_DELAY)
+                    continue
+                logger.error(f"Could not reopen the UDP listener: {e}")
+                gui_log(f"UDP listener on port {config.udp_port} could not be opened: {e}")
+                self._notify_status(f"error: could not reopen the UDP listener: {e}")
+        self.udp_port = config.udp_port if self.udp_transport else 0
+
+    async def _rebind_http(self, server: "uvicorn.Server", host: str, port: int):
+        """Swap uvicorn's listening socket; connections accepted on the old one keep running"""
+        config = server.config
+        config.host, config.port = host, port
+
+        def create_protocol(_loop=None):
+            return config.http_protocol_class(config=config, server_state=server.server_state,
+                                              app_state=server.lifespan.state)
+
+        loop = asyncio.get_running_loop()
+        old = list(server.servers)
+        if port == self.port:
+            # Same port on another interface: the old socket has to go first
+            for listener in old:
+                listener.close()
+            try:
+                server.servers = [await loop.create_server(create_protocol, host=host, port=port,
+                                                           ssl=config.ssl, backlog=config.backlog)]
+            except OSError:
+                config.host, config.port = self.host, self.port
+                try:
+                    server.servers = [await loop.create_server(create_protocol, host=self.host, port=self.port,
+                                                               ssl=config.ssl, backlog=config.backlog)]
+                except OSError:
+                    # Neither address could be bound: nothing is listening any more
+                    server.servers = []
+                raise
+            return
+        try:
+            listener = await loop.create_server(create_protocol, host=host, port=port, ssl=config.ssl,
+                                                backlog=config.backlog)
+        except OSError:
+            config.host, config.port = self.host, self.port
+            raise
+        server.servers = [listener]
+        for listener in old:
+            listener.close()
+
+    def stop(self) -> Future:
+        """Stop the FastAPI server without waiting; see stop_async()"""
+        return self.stop_async()
+
+    def stop_async(self, deadline: Optional[float] = None) -> Future:
+        """Ask the server to shut down; the returned future resolves once it has stopped
+
+        Open requests and streams get `deadline` seconds (default shutdown_deadline) to finish,
+        then they are cancelled and the lifespan shutdown stops the key repeater, the injector
+        and the key log; keys still queued are kept for the next start. Only if that has not
+        finished FORCE_EXIT_MARGIN seconds later is uvicorn forced out.
+        """
         logger.info("ServerManager.stop() called")
         
         if not self.is_running or not self.server:
             logger.warning("Server not running or server instance is None")
-            return
+            return self._stopped
             
         try:
             self.is_running = False
             
             # Signal server to shutdown
-            if self.server:
-                logger.info("Setting server.should_exit = True")
-                self.server.should_exit = True
-                logger.info("Server shutdown signaled")
+            deadline = self.shutdown_deadline if deadline is None else deadline
+            # Read by uvicorn when its shutdown starts, so it is set before signalling
+            self.server.config.timeout_graceful_shutdown = deadline
+            logger.info("Setting server.should_exit = True")
+            self.server.should_exit = True
+            timer = threading.Timer(deadline + FORCE_EXIT_MARGIN, self._force_exit,
+                                    args=(self.server, deadline + FORCE_EXIT_MARGIN))
+            timer.daemon = True
+            timer.start()
+            self._stopped.add_done_callback(lambda _: timer.cancel())
+            logger.info("Server shutdown signaled")
                 
             self._notify_status("stopped")
-            logger.info("ServerManager stopped successfully")
             
         except Exception as e:
             logger.error(f"Error in ServerManager.stop(): {e}")
             logger.error(traceback.format_exc())
-            
-        except Exception as e:
             self._notify_status(f"error: {e}")
-            raise
+        return self._stopped
+
+    def _force_exit(self, server: "uvicorn.Server", deadline: float):
+        if not self._stopped.done():
+            logger.warning(f"Shutdown still running after {deadline}s, forcing exit")
+            server.force_exit = True
+
+    def restart_async(self) -> Future:
+        """Restart in place; the future resolves to the time taken in seconds
+
+        Re-applies config.json, including the settings that otherwise need a restart (injection
+        backend, key log files). A new address is listened on before the old one is released, so
+        there is no window without a listener. Connections, sessions and queued keys are kept.
+        """
+        loop = self.loop
+        if not self.is_running or loop is None:
+            future: Future = Future()
+            future.set_exception(RuntimeError("Server is not running"))
+            return future
+        return asyncio.run_coroutine_threadsafe(self._restart(), loop)
+
+    async def _restart(self) -> float:
+        from server import config, restart_in_place
+        started = time.perf_counter()
+        # Creating a uinput device and restarting the key log block; keep the event loop serving
+        swapped = await asyncio.get_running_loop().run_in_executor(None, restart_in_place)
+        await self._rebind(config.host, config.port, config.udp_port != self.udp_port)
+        if swapped is not None:
+            await asyncio.wrap_future(swapped)
+        elapsed = time.perf_counter() - started
+        logger.info(f"Server restarted in place in {elapsed * 1000:.1f} ms")
+        return elapsed
             
     def get_status(self) -> dict:
         """Get current server status"""
@@ -0,0 +1,108 @@
+"""
+Client Sessions - Who is sending keys
+Each phone or tablet is tracked by IP plus an optional client id, with last-seen time and key rate.
+The session key doubles as the injection worker's scheduling key for that client.
+"""
+
+import math
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+# Sessions seen within this many seconds (or with an open stream) count as connected
+ACTIVE_WINDOW = 30.0
+MAX_SESSIONS = 256
+MAX_CLIENT_ID = 64
+# Time constant of the keys-per-second moving average (seconds)
+RATE_WINDOW = 2.0
+
+
+class ClientSession:
+    """Activity of one client"""
+
+    __slots__ = ('key', 'ip', 'client_id', 'transport', 'first_seen', 'last_seen', 'keys',
+                 'streams', '_rate', '_rate_at')
+
+    def __init__(self, key: str, ip: str, client_id: Optional[str], transport: str, now: float):
+        self.key = key
+        self.ip = ip
+        self.client_id = client_id
+        self.transport = transport
+        self.first_seen = now
+        self.last_seen = now
+        self.keys = 0
+        # Open /ws connections
+        self.streams = 0
+        self._rate = 0.0
+        self._rate_at = now
+
+    def record(self, keys: int = 1, transport: Optional[str] = None):
+        now = time.time()
+        self._rate = self.rate(now) + keys / RATE_WINDOW
+        self._rate_at = now
+        self.last_seen = now
+        self.keys += keys
+        if transport:
+            self.transport = transport
+
+    def rate(self, now: float) -> float:
+        """Exponentially weighted keys per second"""
+        return self._rate * math.exp(-(now - self._rate_at) / RATE_WINDOW)
+
+    def is_active(self, now: float) -> bool:
+        return self.streams > 0 or now - self.last_seen < ACTIVE_WINDOW
+
+    def as_dict(self, now: float, pending: int = 0) -> Dict[str, Any]:
+        return {
+            "client": self.key,
+            "ip": self.ip,
+            "client_id": self.client_id,
+            "transport": self.transport,
+            "keys": self.keys,
+            "keys_per_second": round(self.rate(now), 2),
+            "pending": pending,
+            "streams": self.streams,
+            "connected_for": round(now - self.first_seen, 1),
+            "idle_for": round(now - self.last_seen, 1),
+        }
+
+
+class SessionTable:
+    """Sessions by key, least recently seen first; the oldest are evicted past MAX_SESSIONS
+
+    Written only from the event loop. Readers on other threads (the dashboard) take a snapshot.
+    """
+
+    def __init__(self):
+        self._sessions: "OrderedDict[str, ClientSession]" = OrderedDict()
+
+    @staticmethod
+    def session_key(ip: str, client_id: Optional[str]) -> str:
+        return f"{ip}#{client_id}" if client_id else ip
+
+    def touch(self, ip: str, client_id: Optional[str], transport: str, keys: int = 1) -> ClientSession:
+        """Find or create the client's session and record activity on it"""
+        if client_id:
+            client_id = client_id[:MAX_CLIENT_ID]
+        key = self.session_key(ip, client_id)
+        session = self._sessions.get(key)
+        if session is None:
+            session = self._sessions[key] = ClientSession(key, ip, client_id, transport, time.time())
+            while len(self._sessions) > MAX_SESSIONS:
+                self._sessions.popitem(last=False)
+        else:
+            self._sessions.move_to_end(key)
+        session.record(keys, transport)
+        return session
+
+    def active(self) -> List[ClientSession]:
+        now = time.time()
+        return [s for s in list(self._sessions.values()) if s.is_active(now)]
+
+    def snapshot(self, pending_by_client: Optional[Dict[str, int]] = None) -> List[Dict[str, Any]]:
+        """Active sessions as dicts, busiest first"""
+        now = time.time()
+        pending_by_client = pending_by_client or {}
+        rows = [s.as_dict(now, pending_by_client.get(s.key, 0)) for s in self.active()]
+        rows.sort(key=lambda row: row["keys_per_second"], reverse=True)
+        return rows
@@ -0,0 +1,88 @@
+"""
+Startup Profile - Where launch time goes
+Records import and initialization steps from launch to the first injected key. Steps are always
+collected (they are cheap); set KEYOTE_PROFILE_STARTUP=1 to have the dashboard and server report them.
+"""
+
+import importlib
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from types import ModuleType
+from typing import Iterator, List, Optional, Tuple
+
+ENABLED = os.environ.get("KEYOTE_PROFILE_STARTUP", "") not in ("", "0")
+
+
+def _interpreter_startup() -> Optional[float]:
+    """Seconds between process creation and this module's import; None if unknown"""
+    try:
+        if sys.platform.startswith('linux'):
+            # psutil's create_time is only accurate to the second here; /proc has clock ticks
+            with open('/proc/self/stat') as f:
+                start_ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+            with open('/proc/uptime') as f:
+                uptime = float(f.read().split()[0])
+            return max(0.0, uptime - start_ticks / os.sysconf('SC_CLK_TCK'))
+        import psutil
+        return max(0.0, time.time() - psutil.Process().create_time())
+    except Exception:
+        return None
+
+
+class StartupProfile:
+    """Timeline of named steps, in seconds since this module was imported"""
+
+    def __init__(self, enabled: bool = ENABLED):
+        self.enabled = enabled
+        self.origin = time.perf_counter()
+        # (name, start, duration, thread name); a mark is a step with no duration
+        self.steps: List[Tuple[str, float, Optional[float], str]] = []
+        self._lock = threading.Lock()
+        self.launch_offset = _interpreter_startup() if enabled else None
+
+    def _add(self, name: str, start: float, duration: Optional[float]):
+        with self._lock:
+            self.steps.append((name, start - self.origin, duration, threading.current_thread().name))
+
+    def mark(self, name: str, at: Optional[float] = None):
+        """Record that something happened now (or at perf_counter time `at`)"""
+        self._add(name, time.perf_counter() if at is None else at, None)
+
+    def has(self, name: str) -> bool:
+        return any(step[0] == name for step in self.steps)
+
+    @contextmanager
+    def step(self, name: str) -> Iterator[None]:
+        """Time the enclosed block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._add(name, start, time.perf_counter() - start)
+
+    def import_module(self, name: str) -> ModuleType:
+        """Import a module, timed; modules already loaded by an earlier step cost nothing here"""
+        with self.step(f"import {name}"):
+            return importlib.import_module(name)
+
+    def report(self) -> str:
+        """Human-readable timeline, offsets counted from process launch when known"""
+        offset = self.launch_offset or 0.0
+        lines = ["Startup profile (ms since launch):" if self.launch_offset is not None
+                 else "Startup profile (ms since first import):"]
+        if self.launch_offset is not None:
+            lines.append(f"  {0.0:9.1f} {offset * 1000:9.1f}  interpreter start")
+        with self._lock:
+            steps = sorted(self.steps, key=lambda step: step[1])
+        for name, start, duration, thread in steps:
+            took = f"{duration * 1000:9.1f}" if duration is not None else " " * 9
+            where = "" if thread == "MainThread" else f"  [{thread}]"
+            lines.append(f"  {(start + offset) * 1000:9.1f} {took}  {name}{where}")
+        return "\n".join(lines)
+
+
+# Process-wide timeline shared by the dashboard, server manager and server
+profile = StartupProfile()
@@ -0,0 +1,155 @@
+"""
+UDP Key Listener - Connectionless, low-latency key transport
+Accepts datagrams of binary key frames and restores their sequence order before dispatch
+"""
+
+import asyncio
+import logging
+from typing import Callable, Dict, Optional, Tuple
+
+from key_frames import FrameError, KeyFrame, iter_frames
+
+logger = logging.getLogger(__name__)
+
+# Datagrams held while waiting for a missing sequence number
+REORDER_WINDOW = 32
+# How long a gap may stay open before it is skipped (seconds)
+GAP_TIMEOUT = 0.05
+# A sequence number this far behind means the sender restarted its counter
+RESET_DISTANCE = 1024
+MAX_SENDERS = 64
+
+Address = Tuple[str, int]
+# (key, ctrl, shift, alt, repeat, event)
+KeyTuple = Tuple[str, bool, bool, bool, int, str]
+
+
+class _SenderState:
+    """Per-sender reorder buffer"""
+
+    __slots__ = ('next_seq', 'held', 'gap_timer')
+
+    def __init__(self, next_seq: int):
+        self.next_seq = next_seq
+        self.held: Dict[int, KeyTuple] = {}
+        self.gap_timer: Optional[asyncio.TimerHandle] = None
+
+
+class UDPKeyProtocol(asyncio.DatagramProtocol):
+    """Drops duplicate frames and reorders within a small window before dispatching"""
+
+    def __init__(self, dispatch: Callable[[str, KeyTuple], None], stats,
+                 allow: Optional[Callable[[str], bool]] = None):
+        self.dispatch = dispatch
+        self.stats = stats
+        # Sender filter (allowed_ips), checked before a datagram is decoded
+        self.allow = allow
+        self.senders: Dict[Address, _SenderState] = {}
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        # Resolves once the socket is really closed, i.e. its port can be bound again
+        self.closed: Optional[asyncio.Future] = None
+        self._frame = KeyFrame()
+
+    def connection_made(self, transport):
+        self.loop = asyncio.get_running_loop()
+        self.closed = self.loop.create_future()
+
+    def connection_lost(self, exc):
+        for addr in list(self.senders):
+            self._forget(addr)
+        if self.closed is not None and not self.closed.done():
+            self.closed.set_result(None)
+
+    def datagram_received(self, data: bytes, addr: Address):
+        if self.allow and not self.allow(addr[0]):
+            return
+        self.stats.udp_datagrams += 1
+        try:
+            for frame in iter_frames(data, self._frame):
+                self._receive(addr, frame.seq,
+                              (frame.key, frame.ctrl, frame.shift, frame.alt, frame.repeat, frame.event))
+        except FrameError:
+            self.stats.udp_malformed += 1
+
+    def _receive(self, addr: Address, seq: int, command: KeyTuple):
+        state = self.senders.get(addr)
+        if state is None or seq < state.next_seq - RESET_DISTANCE:
+            state = self._new_sender(addr, seq)
+
+        if seq < state.next_seq or seq in state.held:
+            self.stats.udp_duplicates += 1
+            return
+
+        if seq == state.next_seq:
+            self._deliver(addr, state, command)
+            self._drain(addr, state)
+        else:
+            state.held[seq] = command
+            if len(state.held) > REORDER_WINDOW:
+                self._skip_gap(addr, state)
+            elif state.gap_timer is None:
+                state.gap_timer = self.loop.call_later(GAP_TIMEOUT, self._gap_expired, addr)
+
+    def _new_sender(self, addr: Address, seq: int) -> _SenderState:
+        self._forget(addr)
+        if len(self.senders) >= MAX_SENDERS:
+            self._forget(next(iter(self.senders)))
+        state = _SenderState(seq)
+        self.senders[addr] = state
+        return state
+
+    def _forget(self, addr: Address):
+        state = self.senders.pop(addr, None)
+        if state and state.gap_timer:
+            state.gap_timer.cancel()
+
+    def _deliver(self, addr: Address, state: _SenderState, command: KeyTuple):
+        state.next_seq += 1
+        self.dispatch(addr[0], command)
+
+    def _drain(self, addr: Address, state: _SenderState):
+        while state.next_seq in state.held:
+            self._deliver(addr, state, state.held.pop(state.next_seq))
+        if state.gap_timer and not state.held:
+            state.gap_timer.cancel()
+            state.gap_timer = None
+
+    def _skip_gap(self, addr: Address, state: _SenderState):
+        """Give up on the missing datagram(s) and resume from the oldest held one"""
+        if state.gap_timer:
+            state.gap_timer.cancel()
+            state.gap_timer = None
+        if not state.held:
+            return
+        oldest = min(state.held)
+        self.stats.udp_lost += oldest - state.next_seq
+        state.next_seq = oldest
+        self._drain(addr, state)
+        if state.held:
+            state.gap_timer = self.loop.call_later(GAP_TIMEOUT, self._gap_expired, addr)
+
+    def _gap_expired(self, addr: Address):
+        state = self.senders.get(addr)
+        if state:
+            state.gap_timer = None
+            self._skip_gap(addr, state)
+
+
+async def open_udp_listener(host: str, port: int, dispatch: Callable[[str, KeyTuple], None],
+                            stats, allow: Optional[Callable[[str], bool]] = None) -> asyncio.DatagramTransport:
+    """Bind the UDP key listener on the running event loop"""
+    loop = asyncio.get_running_loop()
+    transport, _ = await loop.create_datagram_endpoint(
+        lambda: UDPKeyProtocol(dispatch, stats, allow),
+        local_addr=(host, port),
+    )
+    logger.info(f"UDP key listener bound on {host}:{port}")
+    return transport
+
+
+async def close_udp_listener(transport: asyncio.DatagramTransport):
+    """Close the listener and wait until its port is free (asyncio closes on a later loop iteration)"""
+    protocol = transport.get_protocol()
+    transport.close()
+    if isinstance(protocol, UDPKeyProtocol) and protocol.closed is not None:
+        await protocol.closed